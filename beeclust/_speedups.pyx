@@ -1,31 +1,50 @@
 #cython: language_level=3, boundscheck=False, wraparound=False, initializedcheck=False, cdivision=True
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy
 cimport numpy
 cimport cython
-from cpython.mem cimport PyMem_Malloc, PyMem_Free
-from libc.stdlib cimport rand, srand, RAND_MAX
+from cython.parallel cimport prange
+from libc.stdlib cimport rand, srand, RAND_MAX, malloc, free
+from libc.math cimport fabs
 from libc.time cimport time
 
 # type shortcuts
 from numpy cimport int64_t as int64
+from numpy cimport int32_t as int32
 from numpy cimport float64_t as float64
 from numpy cimport int8_t as int8
 from numpy cimport uint8_t as uint8
+from numpy cimport uint64_t as uint64
 from numpy cimport ndarray as nd
 
 
+cdef extern from *:
+    """
+    static inline int beeclust_ctz64(unsigned long long x) {
+        return __builtin_ctzll(x);
+    }
+    static inline int beeclust_popcount64(unsigned long long x) {
+        return __builtin_popcountll(x);
+    }
+    """
+    # number of trailing zero bits (x must not be 0), number of set bits
+    int ctz64 "beeclust_ctz64" (uint64 x) nogil
+    int popcount64 "beeclust_popcount64" (uint64 x) nogil
+
+
 # Initialize random
 srand(time(NULL))
 
 
-cdef double rand_0_1():
+cdef double rand_0_1() noexcept nogil:
     """
     Random number between 0 and 1
     """
     return <double>rand() / <double>RAND_MAX
 
 
-cdef int randint(int limit):
+cdef int randint(int limit) noexcept nogil:
     """
     Random positive integer up to {limit} (not included)
     """
@@ -54,105 +73,321 @@ cdef enum Movement:
     WALL_HIT = 0
     BEE_MEET = 1
     MOVE = 2
+    STOP = 3
+
+
+# Parameters of a single tick
+cdef struct params:
+    double p_changedir
+    double p_wall
+    double p_meet
+    double k_stay
+    double T_ideal
+    int8 min_wait
+
+
+# Parameters that can be scheduled,
+# the order is kept by BeeClust.SCHEDULABLE
+cdef enum Parameter:
+    P_CHANGEDIR = 0
+    P_WALL = 1
+    P_MEET = 2
+    K_STAY = 3
+    T_IDEAL = 4
+
+
+# What happened during a single tick
+cdef struct tick_stats:
+    int64 moved
+    int64 stopped
+    int64 wait_sum
+    float64 temp_delta
+
+
+# Metrics recorded by _History, the order is kept by BeeClust.HISTORY_METRICS
+cdef enum Metric:
+    MOVED = 0
+    STOPPED = 1
+    SCORE = 2
     WAIT = 3
 
 
-# Coordinates / indices
-cdef struct coords:
-    int r
-    int c
+cdef class _History:
+    """
+    Internal ring buffer of per-tick metrics, filled by the tick kernels.
+    """
+    cdef readonly nd data
+    cdef float64[:, :] buffer
+    cdef int64[:] metrics
+    cdef readonly int64 count
+
+    def __cinit__(self, int64 capacity, metrics):
+        self.metrics = numpy.array(metrics, dtype='int64')
+        self.data = numpy.empty((capacity, len(metrics)), dtype='float64')
+        self.buffer = self.data
+        self.count = 0
+
+    cdef void record(self, tick_stats *stats, float64 temp_sum,
+                     int64 bee_count) noexcept nogil:
+        cdef int64 row = self.count % self.buffer.shape[0]
+        cdef int j
+        cdef float64 value
+
+        for j in range(self.metrics.shape[0]):
+            if self.metrics[j] == MOVED:
+                value = stats.moved
+            elif self.metrics[j] == STOPPED:
+                value = stats.stopped
+            elif self.metrics[j] == SCORE:
+                value = temp_sum / bee_count if bee_count else NaN
+            else:  # WAIT
+                value = (<float64>stats.wait_sum / stats.stopped
+                         if stats.stopped else NaN)
+            self.buffer[row, j] = value
+        self.count += 1
+
+    def append(self, int64 moved, int64 stopped, int64 wait_sum,
+               float64 temp_sum, int64 bee_count):
+        """
+        Record a tick done elsewhere (e.g. in worker processes).
+        """
+        cdef tick_stats stats
+        stats.moved = moved
+        stats.stopped = stopped
+        stats.wait_sum = wait_sum
+        stats.temp_delta = 0
+        self.record(&stats, temp_sum, bee_count)
+
+
+# Kinds of events logged by _Events, the order is kept by BeeClust.EVENT_KINDS
+cdef enum Event:
+    STOP_WALL = 0
+    STOP_MEET = 1
+    WAKE = 2
 
 
-# A job to put into _JobQueue, has coordinates and distance
-cdef struct job:
-    coords loc
-    int64 dist
+# Fields of logged events
+EVENTS = numpy.dtype([
+    ('tick', 'int64'),
+    ('row', 'int32'),
+    ('col', 'int32'),
+    ('kind', 'int8'),
+    ('temperature', 'float64'),
+    ('wait', 'int8'),
+])
 
 
-cdef class _JobQueue:
+cdef class _Events:
     """
-    Internal class with very basic (and quite stupid) queue.
+    Internal log of stops and wake-ups, filled by the tick kernels.
+
+    Before every tick the kernels make room for an event of every bee,
+    spill(events) is called with the logged events if there is not enough.
+    The room is estimated from the maintained number of bees, which may be
+    stale, so the log spills in the middle of a tick as well when it is full.
     """
-    cdef job * jobs
-    cdef int top, bottom, size
+    cdef readonly nd data
+    cdef int64[:] ticks
+    cdef int32[:] rows
+    cdef int32[:] cols
+    cdef int8[:] kinds
+    cdef float64[:] temperatures
+    cdef int8[:] waits
+    cdef readonly int64 count
+    cdef readonly int64 tick
+    cdef object spill
+
+    def __cinit__(self, int64 capacity, spill):
+        self.data = numpy.empty(capacity, dtype=EVENTS)
+        self.ticks = self.data['tick']
+        self.rows = self.data['row']
+        self.cols = self.data['col']
+        self.kinds = self.data['kind']
+        self.temperatures = self.data['temperature']
+        self.waits = self.data['wait']
+        self.count = 0
+        self.tick = 0
+        self.spill = spill
 
-    def __cinit__(self, int size):
-        self.jobs = <job *>PyMem_Malloc(size * sizeof(job))
-        if self.jobs == NULL:
-            raise MemoryError()
-        self.top = 0
-        self.bottom = 0
-        self.size = size
+    def flush(self):
+        """
+        Pass the logged events to spill() and empty the log.
+        """
+        if self.count:
+            self.spill(self.data[:self.count])
+            self.count = 0
 
-    def __dealloc__(self):
-        if self.jobs != NULL:
-            PyMem_Free(self.jobs)
+    def extend(self, events):
+        """
+        Log events logged elsewhere (e.g. in worker processes)
+        at the current tick, spilling when full.
+        """
+        cdef int64 start = 0, size
+        while start < len(events):
+            if self.count >= self.data.shape[0]:
+                self.flush()
+            size = min(len(events) - start, self.data.shape[0] - self.count)
+            self.data[self.count:self.count + size] = \
+                events[start:start + size]
+            self.ticks[self.count:self.count + size] = self.tick
+            self.count += size
+            start += size
 
-    cdef void put(self, job ajob):
-        self.jobs[self.top % self.size] = ajob
-        self.top += 1
+    def next_tick(self):
+        """
+        Count a tick done elsewhere.
+        """
+        self.tick += 1
 
-    cdef job get(self):
-        self.bottom += 1
-        return self.jobs[(self.bottom-1) % self.size]
+    cdef int reserve(self, int64 bee_count) except -1 nogil:
+        if self.data.shape[0] - self.count >= bee_count:
+            return 0
+        with gil:
+            self.flush()
+        return 0
 
-    cdef bint empty(self):
-        return self.bottom == self.top
+    cdef int log(self, Event kind, int r, int c, float64 temperature,
+                 int8 wait) except -1 nogil:
+        if self.count >= self.data.shape[0]:
+            with gil:
+                self.flush()
+        self.ticks[self.count] = self.tick
+        self.rows[self.count] = r
+        self.cols[self.count] = c
+        self.kinds[self.count] = kind
+        self.temperatures[self.count] = temperature
+        self.waits[self.count] = wait
+        self.count += 1
+        return 0
 
-    cdef void reset(self):
-        self.top = 0
-        self.bottom = 0
 
+cdef enum:
+    # Frontier cells expanded in parallel at once
+    CHUNK = 65536
+    # Smaller frontiers are expanded serially (not worth the threads)
+    PARALLEL_MIN = 4096
+    # Events logged by a worker process before they are collected
+    WORKER_EVENTS = 4096
 
-cdef nd[int64, ndim=2] compute_distances(nd[int8, ndim=2] m, int8 c):
+
+cdef void _expand(int8[:, :] m, int64[:, :] result, int64 cell,
+                  int64 *candidates) noexcept nogil:
+    """
+    Store indices of 8 neighbours of cell that are not walls and have no
+    distance yet to candidates, -1 for others.
+    """
+    cdef int r = cell // m.shape[1]
+    cdef int c = cell % m.shape[1]
+    cdef int r_off, c_off, nr, nc
+    cdef int k = 0
+
+    for r_off in range(-1, 2):
+        for c_off in range(-1, 2):
+            if (r_off == 0) and (c_off == 0):
+                continue
+            nr = r + r_off
+            nc = c + c_off
+            candidates[k] = -1
+            if (0 <= nr < m.shape[0] and 0 <= nc < m.shape[1] and
+                    m[nr, nc] != WALL and result[nr, nc] < 0):
+                candidates[k] = <int64>nr * m.shape[1] + nc
+            k += 1
+
+
+cdef int _compute_distances(int8[:, :] m, int8 source,
+                            int64[:, :] result) noexcept nogil:
     """
     Compute shortest distances to source in our map.
     The distance is computed omnidirectional (8 ways) using BFS.
-    c: Source value (distance for such fields is 0)
-    """
-    cdef nd[int64, ndim=2] result
-    cdef _JobQueue jobs = _JobQueue(m.size * 8)
-    cdef int i
-    cdef coords loc
-    cdef job ajob
-    cdef coords nloc
-    cdef int r_off, c_off
-    cdef int64 dist
-
-    result = numpy.full((m.shape[0], m.shape[1]), -1, dtype='int64')
-    indices = numpy.where(m == c)
-
-    for i in range(len(indices[0])):
-        loc = coords(indices[0][i], indices[1][i])
-        result[loc.r, loc.c] = 0
-        jobs.put(job(loc, 0))
-
-    # BFS
-    while not jobs.empty():
-        ajob = jobs.get()
-        loc = ajob.loc
-        dist = ajob.dist + 1
-        for r_off in range(-1, 2):
-            for c_off in range(-1, 2):
-                if (r_off == 0) and (c_off == 0):
-                    continue
-                nloc.r = loc.r + r_off
-                nloc.c = loc.c + c_off
-                if 0 <= nloc.r < m.shape[0] and 0 <= nloc.c < m.shape[1]:
-                    if m[nloc.r, nloc.c] == WALL:
-                        continue
-                    if (result[nloc.r, nloc.c] < 0 or
-                            result[nloc.r, nloc.c] > dist):
-                        result[nloc.r, nloc.c] = dist
-                        jobs.put(job(nloc, dist))
-    return result
+    source: Source value (distance for such fields is 0)
+
+    The BFS is level-synchronous: neighbours of a whole frontier are found
+    in parallel, then they are deduplicated into the next frontier in order,
+    so the result does not depend on the threads.
+    Returns -1 if out of memory.
+    """
+    cdef int64 cols = m.shape[1]
+    cdef int64 size = m.shape[0] * cols
+    cdef int64 *frontier = <int64 *>malloc(max(size, 1) * sizeof(int64))
+    cdef int64 *following = <int64 *>malloc(max(size, 1) * sizeof(int64))
+    cdef int64 *candidates = <int64 *>malloc(CHUNK * 8 * sizeof(int64))
+    cdef int64 *swap
+    cdef int64 length = 0, count, start, end, i, cell
+    cdef int64 dist = 0
+    cdef int r, c
+
+    if frontier == NULL or following == NULL or candidates == NULL:
+        free(frontier)
+        free(following)
+        free(candidates)
+        return -1
 
+    for r in prange(m.shape[0], schedule='static'):
+        for c in range(cols):
+            result[r, c] = -1
+    for r in range(m.shape[0]):
+        for c in range(cols):
+            if m[r, c] == source:
+                result[r, c] = 0
+                frontier[length] = r * cols + c
+                length += 1
+
+    while length > 0:
+        dist += 1
+        count = 0
+        start = 0
+        while start < length:
+            end = min(start + CHUNK, length)
+            if end - start >= PARALLEL_MIN:
+                for i in prange(start, end, schedule='static'):
+                    _expand(m, result, frontier[i],
+                            candidates + 8 * (i - start))
+            else:
+                for i in range(start, end):
+                    _expand(m, result, frontier[i],
+                            candidates + 8 * (i - start))
+            for i in range(8 * (end - start)):
+                cell = candidates[i]
+                if cell >= 0 and result[cell // cols, cell % cols] < 0:
+                    result[cell // cols, cell % cols] = dist
+                    following[count] = cell
+                    count += 1
+            start = end
+        swap = frontier
+        frontier = following
+        following = swap
+        length = count
+
+    free(frontier)
+    free(following)
+    free(candidates)
+    return 0
 
-def recalculate_heat(nd[float64, ndim=2] heatmap, nd[int8, ndim=2] m,
+
+def compute_distances(int8[:, :] m, int8 source, int64[:, :] result):
+    """
+    Compute shortest distances to source fields into result (see above).
+    """
+    cdef int error
+    if result.shape[0] != m.shape[0] or result.shape[1] != m.shape[1]:
+        raise ValueError('Shapes of the map and the distances differ')
+    with nogil:
+        error = _compute_distances(m, source, result)
+    if error:
+        raise MemoryError()
+
+
+def recalculate_heat(float64[:, :] heatmap, int8[:, :] m,
+                     int64[:, :] heater_distances,
+                     int64[:, :] cooler_distances,
                      float64 T_heater, float64 T_cooler,
                      float64 T_env, float64 k_temp):
     """
     Fast implementation for BeeClust.recalculate_heat().
+
+    Distances to heaters and coolers are computed concurrently
+    in two threads for large maps, each of them expands its BFS frontiers
+    in parallel. The heat of fields is computed in parallel as well.
     """
     cdef float64 heating, cooling
     cdef int r, c
@@ -160,10 +395,23 @@ def recalculate_heat(nd[float64, ndim=2] heatmap, nd[int8, ndim=2] m,
     cdef float64 thk = T_heater - T_env
     cdef float64 tck = T_env - T_cooler
 
-    cdef nd[int64, ndim=2] heater_distances = compute_distances(m, HEATER)
-    cdef nd[int64, ndim=2] cooler_distances = compute_distances(m, COOLER)
+    if (heatmap.shape[0] != m.shape[0] or heatmap.shape[1] != m.shape[1]
+            or heater_distances.shape[0] != m.shape[0]
+            or heater_distances.shape[1] != m.shape[1]
+            or cooler_distances.shape[0] != m.shape[0]
+            or cooler_distances.shape[1] != m.shape[1]):
+        raise ValueError('Shapes of the map and the arrays differ')
+    if m.shape[0] * m.shape[1] >= PARALLEL_MIN:
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            cooling_job = executor.submit(compute_distances, m, COOLER,
+                                          cooler_distances)
+            compute_distances(m, HEATER, heater_distances)
+            cooling_job.result()
+    else:
+        compute_distances(m, HEATER, heater_distances)
+        compute_distances(m, COOLER, cooler_distances)
 
-    for r in range(m.shape[0]):
+    for r in prange(m.shape[0], nogil=True, schedule='static'):
         for c in range(m.shape[1]):
             if m[r, c] == WALL:
                 heatmap[r, c] = NaN
@@ -179,10 +427,9 @@ def recalculate_heat(nd[float64, ndim=2] heatmap, nd[int8, ndim=2] m,
                     cooling = (1.0 / cd) * tck
                     heatmap[r, c] = (T_env + k_temp *
                                      (max(0, heating) - max(0, cooling)))
-    return heatmap
 
 
-cdef bint _is_bee(int8 value):
+cdef bint _is_bee(int8 value) noexcept nogil:
     """
     Tells whether given value represents a bee (simple helper).
     value: Value to be bee-tested
@@ -190,74 +437,490 @@ cdef bint _is_bee(int8 value):
     return value < 0 or 1 <= value <= 4
 
 
-def swarms(nd[int8, ndim=2] m):
+cdef void _occupancy(int8[:, :] m, uint64[:, :] bits) noexcept nogil:
+    """
+    Pack the bee occupancy of the map to bits, 64 fields per word.
+    Bit b of bits[r, w] tells whether there is a bee at (r, w * 64 + b).
+    """
+    cdef int r, w, b, c
+    cdef uint64 word
+
+    for r in range(m.shape[0]):
+        for w in range(bits.shape[1]):
+            word = 0
+            for b in range(min(64, m.shape[1] - w * 64)):
+                c = w * 64 + b
+                if _is_bee(m[r, c]):
+                    word |= (<uint64>1) << b
+            bits[r, w] = word
+
+
+cdef int64 _find_runs(uint64[:, :] bits, int32[:, :] runs) noexcept nogil:
+    """
+    Find runs of bees in rows of the occupancy bits, a word at a time.
+    A run is stored to runs as (row, first column, last column + 1).
+    Returns number of runs.
+    """
+    cdef int64 n = 0, row_first
+    cdef int r, w, start, length, col
+    cdef uint64 word, inverted
+
+    for r in range(bits.shape[0]):
+        row_first = n
+        for w in range(bits.shape[1]):
+            word = bits[r, w]
+            while word:
+                start = ctz64(word)
+                inverted = ~(word >> start)
+                length = 64 - start if inverted == 0 else ctz64(inverted)
+                col = w * 64 + start
+                if n > row_first and runs[n - 1, 2] == col:
+                    # continues a run from the previous word
+                    runs[n - 1, 2] = col + length
+                else:
+                    runs[n, 0] = r
+                    runs[n, 1] = col
+                    runs[n, 2] = col + length
+                    n += 1
+                if start + length == 64:
+                    word = 0
+                else:
+                    word &= ~(((<uint64>1) << (start + length)) - 1)
+    return n
+
+
+cdef int64 _label_runs(int32[:, :] runs, int64 n,
+                       int64[:] parents) noexcept nogil:
+    """
+    Label 4-connected swarms given by runs (sorted by rows and columns).
+    Runs overlapping in neighbouring rows are joined by union-find.
+    Labels from 0 in the order of the swarms' first fields are stored
+    as the 4th item of runs. Returns number of swarms.
+    """
+    cdef int64 i, j = 0, first = 0, count = 0
+    cdef int64 a, b
+
+    for i in range(n):
+        parents[i] = i
+    # i goes over runs in a row, j over runs in the previous row
+    for i in range(n):
+        if i > 0 and runs[i, 0] != runs[i - 1, 0]:
+            # a new row, runs from j up to first are the previous one
+            j = first if runs[first, 0] == runs[i, 0] - 1 else i
+            first = i
+        while j < first and runs[j, 2] <= runs[i, 1]:
+            j += 1
+        while j < first and runs[j, 1] < runs[i, 2]:
+            a = _find(parents, i)
+            b = _find(parents, j)
+            if a != b:
+                parents[max(a, b)] = min(a, b)
+            if runs[j, 2] > runs[i, 2]:
+                break
+            j += 1
+
+    for i in range(n):
+        a = _find(parents, i)
+        if a == i:
+            runs[i, 3] = count
+            count += 1
+        else:
+            runs[i, 3] = runs[a, 3]
+    return count
+
+
+cdef tuple _swarm_runs(int8[:, :] m):
+    """
+    Label swarms in the map via bit-packed occupancy.
+    Returns runs of bees (row, first column, last column + 1, label)
+    and number of swarms.
+    """
+    cdef uint64[:, :] bits = numpy.empty((m.shape[0], (m.shape[1] + 63) // 64),
+                                         dtype='uint64')
+    cdef int64 bees = 0, n, count
+    cdef int r, w
+    cdef int32[:, :] runs
+    cdef int64[:] parents
+
+    with nogil:
+        _occupancy(m, bits)
+        for r in range(bits.shape[0]):
+            for w in range(bits.shape[1]):
+                bees += popcount64(bits[r, w])
+    # there can't be more runs than bees
+    result = numpy.empty((bees, 4), dtype='int32')
+    runs = result
+    parents = numpy.empty(bees, dtype='int64')
+    with nogil:
+        n = _find_runs(bits, runs)
+        count = _label_runs(runs, n, parents)
+    return result[:n], count
+
+
+def swarms(int8[:, :] m):
     """
     Fast implementation for BeeClust.swarms.
     """
-    cdef nd[uint8, ndim=2] done
-    cdef coords loc, nloc
-    cdef job ajob
-    cdef int direction
-    # we don't use the .dist attr of the job, but meh, let's reuse the queue
-    cdef _JobQueue q = _JobQueue(m.size)
+    cdef int32[:, :] runs
+    cdef int64 i, count
+    cdef int c
 
-    done = numpy.zeros((m.shape[0], m.shape[1]), dtype='uint8')
-    result = []
+    runs_array, count = _swarm_runs(m)
+    runs = runs_array
+    result = [[] for i in range(count)]
+    for i in range(runs.shape[0]):
+        swarm = result[runs[i, 3]]
+        for c in range(runs[i, 1], runs[i, 2]):
+            swarm.append((runs[i, 0], c))
+    return result
 
-    for r in range(m.shape[0]):
-        for c in range(m.shape[1]):
-            if done[r, c] or not _is_bee(m[r, c]):
-                continue
-            swarm = [(r, c)]
-            q.reset()
-            q.put(job(coords(r, c), 0))
-            done[r, c] = True
-            # BFS
-            while not q.empty():
-                ajob = q.get()
-                loc = ajob.loc
-                for direction in range(4):
-                    nloc = loc
-                    if direction == 0:
-                        nloc.r -= 1
-                    elif direction == 1:
-                        nloc.c += 1
-                    elif direction == 2:
-                        nloc.r += 1
-                    else:
-                        nloc.c -= 1
-                    if 0 <= nloc.r < m.shape[0] and 0 <= nloc.c < m.shape[1]:
-                        if (_is_bee(m[nloc.r, nloc.c])
-                                and not done[nloc.r, nloc.c]):
-                            done[nloc.r, nloc.c] = True
-                            swarm.append((nloc.r, nloc.c))
-                            q.put(job(nloc, 0))
-            result.append(swarm)
+
+# Fields of swarm_stats() results
+SWARM_STATS = numpy.dtype([
+    ('size', 'int64'),
+    ('temperature', 'float64'),
+    ('stopped', 'float64'),
+    ('top', 'int64'),
+    ('left', 'int64'),
+    ('bottom', 'int64'),
+    ('right', 'int64'),
+])
+
+
+def swarm_stats(int8[:, :] m, float64[:, :] heatmap):
+    """
+    Fast implementation for BeeClust.swarm_stats().
+    The statistics are aggregated over runs of bees found while labeling.
+    """
+    cdef int32[:, :] runs
+    cdef int64 i, count, label
+    cdef int r, c
+
+    runs_array, count = _swarm_runs(m)
+    runs = runs_array
+    result = numpy.zeros(count, dtype=SWARM_STATS)
+    cdef int64[:] sizes = result['size']
+    cdef float64[:] temperatures = result['temperature']
+    cdef float64[:] stops = result['stopped']
+    cdef int64[:] tops = result['top']
+    cdef int64[:] lefts = result['left']
+    cdef int64[:] bottoms = result['bottom']
+    cdef int64[:] rights = result['right']
+
+    with nogil:
+        for i in range(runs.shape[0]):
+            label = runs[i, 3]
+            r = runs[i, 0]
+            if sizes[label] == 0:
+                # the first run of a swarm
+                tops[label] = r
+                lefts[label] = runs[i, 1]
+                rights[label] = runs[i, 2] - 1
+            sizes[label] += runs[i, 2] - runs[i, 1]
+            bottoms[label] = r
+            lefts[label] = min(lefts[label], runs[i, 1])
+            rights[label] = max(rights[label], runs[i, 2] - 1)
+            for c in range(runs[i, 1], runs[i, 2]):
+                temperatures[label] += heatmap[r, c]
+                stops[label] += m[r, c] < 0
+        for label in range(count):
+            temperatures[label] /= sizes[label]
+            stops[label] /= sizes[label]
     return result
 
 
-def tick(nd[int8, ndim=2] m,
-         nd[float64, ndim=2] heatmap,
-         double p_changedir, double p_wall, double p_meet,
-         int8 min_wait, double k_stay, double T_ideal):
+def label(int8[:, :] m, int64[:, :] labels, int64 first):
     """
-    Fast implementation for BeeClust.tick().
+    Label 4-connected swarms of bees for beeclust.distributed.
+
+    Fields of the n-th found swarm are set to first + n in labels,
+    fields without bees are set to 0.
+    Returns number of swarms.
+    """
+    cdef int32[:, :] runs
+    cdef int64 i, count
+    cdef int c
+
+    runs_array, count = _swarm_runs(m)
+    runs = runs_array
+    with nogil:
+        labels[:, :] = 0
+        for i in range(runs.shape[0]):
+            for c in range(runs[i, 1], runs[i, 2]):
+                labels[runs[i, 0], c] = first + runs[i, 3]
+    return count
+
+
+cdef int64 _find(int64[:] parents, int64 x) noexcept nogil:
+    """
+    Find root of x in union-find forest, compressing the path.
+    """
+    cdef int64 root = x, up
+    while parents[root] != root:
+        root = parents[root]
+    while parents[x] != root:
+        up = parents[x]
+        parents[x] = root
+        x = up
+    return root
+
+
+def merge_labels(int64[:, :] labels, int64[:] boundaries, uint8[:] used):
+    """
+    Merge swarm labels of strips into labels of the whole map.
+
+    labels: labels from label() of all strips, unique across strips
+    boundaries: first rows of strips (except the first one)
+    used: flags of labels assigned by label(), indexed by label
+
+    Returns a mapping array from old labels to new ones numbered from 1
+    (0 stays 0) and number of swarms.
+    """
+    cdef int64 total = used.shape[0] - 1
+    cdef int64[:] parents = numpy.arange(total + 1, dtype='int64')
+    mapping = numpy.zeros(total + 1, dtype='int64')
+    cdef int64[:] new = mapping
+    cdef int64 a, b, count = 0, row
+    cdef int i, c
+
+    with nogil:
+        for i in range(boundaries.shape[0]):
+            row = boundaries[i]
+            for c in range(labels.shape[1]):
+                a = labels[row - 1, c]
+                b = labels[row, c]
+                if a and b:
+                    a = _find(parents, a)
+                    b = _find(parents, b)
+                    if a != b:
+                        parents[max(a, b)] = min(a, b)
+        for a in range(1, total + 1):
+            if not used[a]:
+                continue
+            b = _find(parents, a)
+            if b == a:
+                count += 1
+                new[a] = count
+            else:
+                new[a] = new[b]
+    return mapping, count
+
+
+def count_bees(int8[:, :] m, float64[:, :] heatmap=None,
+               float64[:] totals=None):
+    """
+    Count bees in the map and sum their temperatures in one pass.
+    The temperature sum is stored to totals[0] if heatmap is given,
+    number of bees is returned.
     """
-    cdef nd[uint8, ndim=2] done
     cdef int r, c
-    cdef int8 next_dir, wait
-    cdef int moved = 0
+    cdef int64 count = 0
+    cdef float64 temp_sum = 0
+    cdef bint temps = heatmap is not None
 
-    done = numpy.zeros((m.shape[0], m.shape[1]), dtype='uint8')
+    with nogil:
+        for r in range(m.shape[0]):
+            for c in range(m.shape[1]):
+                if _is_bee(m[r, c]):
+                    count += 1
+                    if temps:
+                        temp_sum += heatmap[r, c]
+    if temps:
+        totals[0] = temp_sum
+    return count
 
-    for r in range(m.shape[0]):
+
+def integrate(int8[:, :] m, float64[:, :] heatmap,
+              int64[:, :] counts, float64[:, :] temps):
+    """
+    Fill summed-area tables of bees and of their temperatures in one pass.
+
+    Both tables have a row and a column more than the map,
+    [r, c] holds the sum over the map[:r, :c] rectangle.
+    """
+    cdef int r, c
+    cdef int64 row_count
+    cdef float64 row_temp
+
+    with nogil:
+        counts[0, :] = 0
+        temps[0, :] = 0
+        for r in range(m.shape[0]):
+            row_count = 0
+            row_temp = 0
+            counts[r + 1, 0] = 0
+            temps[r + 1, 0] = 0
+            for c in range(m.shape[1]):
+                if _is_bee(m[r, c]):
+                    row_count += 1
+                    row_temp += heatmap[r, c]
+                counts[r + 1, c + 1] = counts[r, c + 1] + row_count
+                temps[r + 1, c + 1] = temps[r, c + 1] + row_temp
+
+
+def forget(int8[:, :] m):
+    """
+    Fast implementation for BeeClust.forget().
+    """
+    cdef int r, c
+    with nogil:
+        for r in range(m.shape[0]):
+            for c in range(m.shape[1]):
+                if _is_bee(m[r, c]):
+                    m[r, c] = -1
+
+
+def wake_all(int8[:, :] m):
+    """
+    Fast implementation for BeeClust.wake_all().
+    """
+    cdef int r, c
+    with nogil:
+        for r in range(m.shape[0]):
+            for c in range(m.shape[1]):
+                if m[r, c] < 0:
+                    m[r, c] = -1
+
+
+cdef _check_coords(int8[:, :] m, int64[:, :] coords, bint bees):
+    """
+    Check that all coords are in the map and there are bees (or nothing).
+    """
+    cdef int64 i, r, c
+    for i in range(coords.shape[0]):
+        r = coords[i, 0]
+        c = coords[i, 1]
+        if not (0 <= r < m.shape[0] and 0 <= c < m.shape[1]):
+            raise ValueError(f'Coordinates ({r}, {c}) are out of the map')
+        if bees and not _is_bee(m[r, c]):
+            raise ValueError(f'There is no bee at ({r}, {c})')
+        if not bees and m[r, c] != EMPTY:
+            raise ValueError(f'Field ({r}, {c}) is not empty')
+
+
+cdef _check_values(int8[:] values, bint directions):
+    """
+    Check that values are bees (or only directions of moving bees).
+    """
+    cdef int64 i
+    for i in range(values.shape[0]):
+        if not (1 <= values[i] <= 4 or (values[i] < 0 and not directions)):
+            raise ValueError(f'{values[i]} is not a valid '
+                             f'{"direction" if directions else "bee"}')
+
+
+def place_bees(int8[:, :] m, float64[:, :] heatmap, int64[:, :] coords,
+               int8[:] states, float64[:] totals):
+    """
+    Fast implementation for BeeClust.place_bees().
+    states: one state for all the bees or a state for each of them
+    heatmap: None if totals are outdated anyway
+    Returns number of placed bees (duplicate coords are placed once).
+    """
+    cdef int64 i, r, c, placed = 0
+    cdef bint single = states.shape[0] == 1
+    cdef bint temps = heatmap is not None
+
+    _check_coords(m, coords, False)
+    _check_values(states, False)
+    with nogil:
+        for i in range(coords.shape[0]):
+            r = coords[i, 0]
+            c = coords[i, 1]
+            if m[r, c] == EMPTY:
+                placed += 1
+                if temps:
+                    totals[0] += heatmap[r, c]
+            m[r, c] = states[0 if single else i]
+    return placed
+
+
+def remove_bees(int8[:, :] m, float64[:, :] heatmap, int64[:, :] coords,
+                float64[:] totals):
+    """
+    Fast implementation for BeeClust.remove_bees().
+    heatmap: None if totals are outdated anyway
+    Returns number of removed bees (duplicate coords are removed once).
+    """
+    cdef int64 i, r, c, removed = 0
+    cdef bint temps = heatmap is not None
+
+    _check_coords(m, coords, True)
+    with nogil:
+        for i in range(coords.shape[0]):
+            r = coords[i, 0]
+            c = coords[i, 1]
+            if m[r, c] != EMPTY:
+                removed += 1
+                if temps:
+                    totals[0] -= heatmap[r, c]
+                m[r, c] = EMPTY
+    return removed
+
+
+def set_directions(int8[:, :] m, int64[:, :] coords, int8[:] directions):
+    """
+    Fast implementation for BeeClust.set_directions().
+    directions: one direction for all the bees or a direction for each
+    """
+    cdef int64 i
+    cdef bint single = directions.shape[0] == 1
+
+    _check_coords(m, coords, True)
+    _check_values(directions, True)
+    with nogil:
+        for i in range(coords.shape[0]):
+            m[coords[i, 0], coords[i, 1]] = directions[0 if single else i]
+
+
+cdef int8 _wait(float64 temp, params *p) noexcept nogil:
+    """
+    Number of ticks a bee stops for at given temperature.
+    """
+    cdef int8 wait = <int8>(p.k_stay / (1 + fabs(temp - p.T_ideal)))
+    return max(p.min_wait, wait)
+
+
+cdef int _tick(int8[:, :] m, float64[:, :] heatmap, uint8[:, :] done,
+               params *p, tick_stats *stats,
+               int lo, int hi, int32 *north, int32 *south,
+               _Events events=None) except -1 nogil:
+    """
+    Do single step of BeeClust algorithm, without touching Python objects.
+    done: helper array of the map's shape, its content is overwritten
+    stats: filled with information about the tick
+    events: log of stops and wake-ups (spilled when full)
+
+    Only rows from lo to hi (not included) are ticked, the others are halo
+    rows owned by someone else. Bees heading to an empty or bee field in
+    the halo are not moved, their columns are appended to north or south
+    (count is at index 0) to be resolved later (see resolve()).
+    """
+    cdef int r, c, nr, nc
+    cdef int8 next_dir
+    # a halo field can be changed by its owner, so it is read only once
+    cdef volatile int8 target
+    cdef int32 *requests
+    cdef Movement movement
+    cdef Event reason
+    cdef bint logging = events is not None
+
+    stats.moved = 0
+    stats.stopped = 0
+    stats.wait_sum = 0
+    stats.temp_delta = 0
+    done[:, :] = 0
+
+    for r in range(lo, hi):
         for c in range(m.shape[1]):
             if done[r, c]:
                 continue
             if m[r, c] == -1:
                 m[r, c] = randint(4) + 1
+                if logging:
+                    events.log(WAKE, r, c, heatmap[r, c], 0)
             elif 1 <= m[r, c] <= 4:
-                if rand_0_1() < p_changedir:
+                if rand_0_1() < p.p_changedir:
                     next_dir = randint(3) + 1
                     if next_dir == m[r, c]:
                         next_dir = 4
@@ -274,30 +937,367 @@ def tick(nd[int8, ndim=2] m,
 
                 movement = WALL_HIT
                 if 0 <= nr < m.shape[0] and 0 <= nc < m.shape[1]:
-                    if 1 <= m[nr, nc] <= 4 or m[nr, nc] < 0:
+                    target = m[nr, nc]
+                    if nr < lo or nr >= hi:
+                        # never moved here, a wall is hit otherwise
+                        if target == EMPTY or _is_bee(target):
+                            requests = north if nr < lo else south
+                            requests[0] += 1
+                            requests[requests[0]] = c
+                            done[r, c] = True
+                            continue
+                    elif _is_bee(target):
                         movement = BEE_MEET
-                    elif m[nr, nc] == EMPTY:
+                    elif target == EMPTY:
                         movement = MOVE
 
                 if movement == WALL_HIT:
-                    if rand_0_1() < p_wall:
-                        movement = WAIT
+                    if rand_0_1() < p.p_wall:
+                        movement = STOP
+                        reason = STOP_WALL
                     else:
                         m[r, c] = (m[r, c] + 1) % 4 + 1
-                elif movement == BEE_MEET and rand_0_1() < p_meet:
-                    movement = WAIT
+                elif movement == BEE_MEET and rand_0_1() < p.p_meet:
+                    movement = STOP
+                    reason = STOP_MEET
 
-                if movement == WAIT:
-                    wait = <int8>(k_stay /(1 + abs(heatmap[r, c] - T_ideal)))
-                    wait = max(min_wait, wait)
-                    m[r, c] = -1 * wait
+                if movement == STOP:
+                    m[r, c] = -_wait(heatmap[r, c], p)
+                    stats.stopped += 1
+                    stats.wait_sum -= m[r, c]
+                    if logging:
+                        events.log(reason, r, c, heatmap[r, c], -m[r, c])
                 elif movement == MOVE:
-                    moved += 1
+                    stats.moved += 1
+                    stats.temp_delta += heatmap[nr, nc] - heatmap[r, c]
                     m[nr, nc] = m[r, c]
                     m[r, c] = EMPTY
                     done[nr, nc] = True
             elif m[r, c] < 0:
                 m[r, c] += 1
+                stats.stopped += 1
+                stats.wait_sum -= m[r, c]
             done[r, c] = True
+    return 0
+
+
+def tick(int8[:, :] m, float64[:, :] heatmap,
+         double p_changedir, double p_wall, double p_meet,
+         int8 min_wait, double k_stay, double T_ideal,
+         float64[:] totals, int64 bee_count, _History history=None,
+         _Events events=None):
+    """
+    Fast implementation for BeeClust.tick().
+    Temperature change of moved bees is added to totals[0].
+    """
+    cdef params p = params(p_changedir, p_wall, p_meet,
+                           k_stay, T_ideal, min_wait)
+    cdef tick_stats stats
+    cdef uint8[:, :] done = numpy.empty((m.shape[0], m.shape[1]),
+                                        dtype='uint8')
+    cdef bint recording = history is not None
+    cdef bint logging = events is not None
+
+    with nogil:
+        if logging:
+            events.reserve(bee_count)
+        _tick(m, heatmap, done, &p, &stats, 0, m.shape[0], NULL, NULL,
+              events)
+        totals[0] += stats.temp_delta
+        if recording:
+            history.record(&stats, totals[0], bee_count)
+        if logging:
+            events.tick += 1
+    return stats.moved
 
-    return moved
+
+def _worker_log():
+    """
+    Event log of a worker process for beeclust.distributed.
+
+    Returns the log and a function returning all the events logged so far.
+    """
+    chunks = []
+    events = _Events(WORKER_EVENTS,
+                     lambda logged: chunks.append(logged.copy()))
+
+    def collect():
+        events.flush()
+        if not chunks:
+            return numpy.empty(0, dtype=EVENTS)
+        return numpy.concatenate(chunks)
+
+    return events, collect
+
+
+def tick_strip(int8[:, :] m, float64[:, :] heatmap,
+               double p_changedir, double p_wall, double p_meet,
+               int8 min_wait, double k_stay, double T_ideal,
+               int lo, int hi, int32[:] north, int32[:] south,
+               bint logging=False):
+    """
+    Fast implementation of a tick of a strip for beeclust.distributed.
+
+    m and heatmap are views of the strip with halo rows, only rows from
+    lo to hi (not included) are ticked. Columns of bees heading to the halo
+    are stored to north and south, count first (they need to be long enough).
+
+    Returns tuple: number of moved bees, temperature change of moved bees,
+    number of stopped bees, sum of their waits, logged events (rows
+    relative to m, ticks 0) or None without {logging}.
+    """
+    cdef params p = params(p_changedir, p_wall, p_meet,
+                           k_stay, T_ideal, min_wait)
+    cdef tick_stats stats
+    cdef uint8[:, :] done = numpy.empty((m.shape[0], m.shape[1]),
+                                        dtype='uint8')
+    cdef _Events events = None
+
+    if logging:
+        events, collect = _worker_log()
+    north[0] = south[0] = 0
+    with nogil:
+        _tick(m, heatmap, done, &p, &stats, lo, hi, &north[0], &south[0],
+              events)
+    return (stats.moved, stats.temp_delta, stats.stopped, stats.wait_sum,
+            collect() if logging else None)
+
+
+def resolve(int8[:, :] m, float64[:, :] heatmap,
+            double p_changedir, double p_wall, double p_meet,
+            int8 min_wait, double k_stay, double T_ideal,
+            int32[:] south, int32[:] north, bint logging=False):
+    """
+    Fast implementation of halo exchange for beeclust.distributed.
+
+    m and heatmap are views of two rows around a boundary of strips.
+    Bees from the upper row heading south (columns in south, count first)
+    are resolved first, then bees from the lower row heading north,
+    always from the west, so the result does not depend on timing.
+    A bee moves if the field is empty, otherwise it meets another bee.
+
+    Returns tuple like tick_strip().
+    """
+    cdef params p = params(p_changedir, p_wall, p_meet,
+                           k_stay, T_ideal, min_wait)
+    cdef int64 moved = 0, stopped = 0, wait_sum = 0
+    cdef float64 temp_delta = 0
+    cdef int32 *requests
+    cdef int i, c, row, side
+    cdef _Events events = None
+
+    if logging:
+        events, collect = _worker_log()
+    with nogil:
+        for side in range(2):
+            requests = &south[0] if side == 0 else &north[0]
+            row = side  # source row, the target is the other one
+            for i in range(1, requests[0] + 1):
+                c = requests[i]
+                if m[1 - row, c] == EMPTY:
+                    moved += 1
+                    temp_delta += heatmap[1 - row, c] - heatmap[row, c]
+                    m[1 - row, c] = m[row, c]
+                    m[row, c] = EMPTY
+                elif rand_0_1() < p.p_meet:
+                    m[row, c] = -_wait(heatmap[row, c], &p)
+                    stopped += 1
+                    wait_sum -= m[row, c]
+                    if logging:
+                        events.log(STOP_MEET, row, c, heatmap[row, c],
+                                   -m[row, c])
+    return (moved, temp_delta, stopped, wait_sum,
+            collect() if logging else None)
+
+
+def seed(unsigned int value):
+    """
+    Seed the random generator of the kernels (e.g. in a new process).
+    """
+    srand(value)
+
+
+def run(int8[:, :] m, float64[:, :] heatmap,
+        double p_changedir, double p_wall, double p_meet,
+        int8 min_wait, double k_stay, double T_ideal,
+        float64[:] totals, int64 bee_count, int64 ticks,
+        float64[:] criteria=None, _History history=None,
+        float64[:, :] schedule=None, int64[:] scheduled=None,
+        _Events events=None):
+    """
+    Fast implementation for BeeClust.run() and BeeClust.run_until().
+
+    Does up to {ticks} ticks. If {criteria} are given (maximal moved
+    fraction, maximal score drift, minimal stopped ratio, window), it
+    stops as soon as all the thresholds hold for {window} consecutive ticks.
+
+    If {schedule} is given, its i-th row holds values of parameters
+    for the i-th tick, the columns are parameters listed in {scheduled}
+    (in the Parameter order).
+
+    Stops and wake-ups are logged to {events} if given.
+
+    Returns tuple: ticks done, total moves, ticks the criteria held.
+    """
+    cdef params p = params(p_changedir, p_wall, p_meet,
+                           k_stay, T_ideal, min_wait)
+    cdef tick_stats stats
+    cdef uint8[:, :] done = numpy.empty((m.shape[0], m.shape[1]),
+                                        dtype='uint8')
+    cdef int64 i = 0, moved = 0, streak = 0, window = 0
+    cdef float64 max_moved = 0, max_drift = 0, min_stopped = 0
+    cdef float64 n = max(bee_count, 1)
+    cdef bint recording = history is not None
+    cdef bint logging = events is not None
+    cdef int j
+    cdef int columns = 0
+
+    if schedule is not None:
+        columns = scheduled.shape[0]
+        if schedule.shape[0] < ticks or schedule.shape[1] != columns:
+            raise ValueError('Schedule does not match ticks and parameters')
+    if criteria is not None:
+        max_moved = criteria[0]
+        max_drift = criteria[1]
+        min_stopped = criteria[2]
+        window = <int64>criteria[3]
+
+    with nogil:
+        while i < ticks:
+            for j in range(columns):
+                if scheduled[j] == P_CHANGEDIR:
+                    p.p_changedir = schedule[i, j]
+                elif scheduled[j] == P_WALL:
+                    p.p_wall = schedule[i, j]
+                elif scheduled[j] == P_MEET:
+                    p.p_meet = schedule[i, j]
+                elif scheduled[j] == K_STAY:
+                    p.k_stay = schedule[i, j]
+                else:  # T_IDEAL
+                    p.T_ideal = schedule[i, j]
+            if logging:
+                events.reserve(bee_count)
+            _tick(m, heatmap, done, &p, &stats, 0, m.shape[0], NULL, NULL,
+                  events)
+            i += 1
+            moved += stats.moved
+            totals[0] += stats.temp_delta
+            if recording:
+                history.record(&stats, totals[0], bee_count)
+            if logging:
+                events.tick += 1
+            if window == 0:
+                continue
+            if (stats.moved / n <= max_moved and
+                    fabs(stats.temp_delta) / n <= max_drift and
+                    stats.stopped / n >= min_stopped):
+                streak += 1
+                if streak >= window:
+                    break
+            else:
+                streak = 0
+
+    return i, moved, streak
+
+
+cdef void _color(int8 value, uint8 *rgba) noexcept nogil:
+    """
+    Set RGB of a map object (bees by direction and stop state).
+    Empty fields are left untouched.
+    """
+    if value < 0:
+        rgba[0], rgba[1], rgba[2] = 255, 255, 255
+    elif value == BEE_NORTH:
+        rgba[0], rgba[1], rgba[2] = 255, 255, 0
+    elif value == BEE_EAST:
+        rgba[0], rgba[1], rgba[2] = 255, 128, 0
+    elif value == BEE_SOUTH:
+        rgba[0], rgba[1], rgba[2] = 0, 255, 0
+    elif value == BEE_WEST:
+        rgba[0], rgba[1], rgba[2] = 255, 0, 255
+    elif value == WALL:
+        rgba[0], rgba[1], rgba[2] = 128, 128, 128
+    elif value == HEATER:
+        rgba[0], rgba[1], rgba[2] = 255, 0, 0
+    elif value == COOLER:
+        rgba[0], rgba[1], rgba[2] = 0, 0, 255
+
+
+cdef void _heat_color(float64 temp, float64 T_low, float64 T_high,
+                      uint8 *rgba) noexcept nogil:
+    """
+    Set RGB of a temperature, dark blue (T_low) to dark red (T_high).
+    """
+    cdef float64 t = 0.5
+    if T_high > T_low:
+        t = min(1.0, max(0.0, (temp - T_low) / (T_high - T_low)))
+    rgba[0] = <uint8>(128 * t)
+    rgba[1] = 0
+    rgba[2] = <uint8>(128 * (1 - t))
+
+
+def render(int8[:, :] m, float64[:, :] heatmap, uint8[:, :, :] out,
+           int scale, float64 T_low, float64 T_high, bint heat):
+    """
+    Fast implementation for BeeClust.render().
+
+    With scale 1, every field is rendered to one pixel.
+    With larger scale, every pixel shows density of bees in a scale×scale
+    block of fields, blended over the block's mean temperature.
+    heat: whether to render temperatures of empty fields, black otherwise
+      (heatmap is not used and can be None without it)
+    """
+    cdef int rows = (m.shape[0] + scale - 1) // scale
+    cdef int cols = (m.shape[1] + scale - 1) // scale
+    cdef int r, c, br, bc
+    cdef int64 bees, fields, walls
+    cdef float64 temp_sum, alpha
+    cdef uint8 rgba[4]
+
+    if out.shape[0] != rows or out.shape[1] != cols or out.shape[2] != 4:
+        raise ValueError(f'Wrong shape of out ({out.shape[0]}, '
+                         f'{out.shape[1]}, {out.shape[2]}), '
+                         f'expected ({rows}, {cols}, 4)')
+
+    with nogil:
+        rgba[3] = 255
+        if scale == 1:
+            for r in range(rows):
+                for c in range(cols):
+                    if heat and m[r, c] == EMPTY:
+                        _heat_color(heatmap[r, c], T_low, T_high, rgba)
+                    else:
+                        rgba[0], rgba[1], rgba[2] = 0, 0, 0
+                        _color(m[r, c], rgba)
+                    out[r, c, 0] = rgba[0]
+                    out[r, c, 1] = rgba[1]
+                    out[r, c, 2] = rgba[2]
+                    out[r, c, 3] = rgba[3]
+        else:
+            for br in range(rows):
+                for bc in range(cols):
+                    bees = fields = walls = 0
+                    temp_sum = 0
+                    for r in range(br * scale,
+                                   min((br + 1) * scale, m.shape[0])):
+                        for c in range(bc * scale,
+                                       min((bc + 1) * scale, m.shape[1])):
+                            fields += 1
+                            if m[r, c] == WALL:
+                                walls += 1
+                                continue
+                            if heat:
+                                temp_sum += heatmap[r, c]
+                            if _is_bee(m[r, c]):
+                                bees += 1
+                    rgba[0], rgba[1], rgba[2] = 0, 0, 0
+                    if walls == fields:
+                        _color(WALL, rgba)
+                    elif heat:
+                        _heat_color(temp_sum / (fields - walls),
+                                    T_low, T_high, rgba)
+                    alpha = <float64>bees / fields
+                    out[br, bc, 0] = <uint8>(rgba[0] + alpha * (255 - rgba[0]))
+                    out[br, bc, 1] = <uint8>(rgba[1] + alpha * (255 - rgba[1]))
+                    out[br, bc, 2] = <uint8>(rgba[2] * (1 - alpha))
+                    out[br, bc, 3] = rgba[3]
@@ -1,6 +1,10 @@
+import os
+import threading
+import warnings
+
 import numpy
 
-from . import _speedups
+from . import _speedups, density, streaming
 
 
 class BeeClust:
@@ -17,19 +21,46 @@ class BeeClust:
      T_ideal, T_heater, T_cooler, T_env:
        ideal temperature for bees, temperature of heaters, coolers, environment
      min_wait: minimal time a bee remains stopped
+     copy: if False, simulate in place in the map's buffer (any writable
+       int8 buffer, e.g. numpy array, memoryview, mmap or shared memory
+       cast to 2D); it is only copied with a warning if it's not possible;
+       when the buffer is written by someone else, call invalidate_heat()
+       before using score, bee_count, history or events, the maintained
+       counters are stale otherwise
 
     Attributes:
      map: the actual map as described above
-     heatmap: information about temperature of every field of the map
+     heatmap: information about temperature of every field of the map,
+       computed lazily on first use (see invalidate_heat)
      bees: list of tuples (indices) of bees locations
      swarm: list of lists of tuples (indices) with connecting bees
      score: average temperature of fields with bees
+     bee_count: number of bees in the map
+     history: recorded per-tick metrics (see record_history) or None
+     events: logged stops and wake-ups (see record_events) or None
     """
+    #: Convergence criteria of run_until() with their inactive values,
+    #: the order is used by kernel
+    CRITERIA = {
+        'moved': float('inf'),
+        'drift': float('inf'),
+        'stopped': 0.0,
+        'window': 1,
+    }
+    #: Metrics that can be recorded to history, the order is used by kernel
+    HISTORY_METRICS = ('moved', 'stopped', 'score', 'wait')
+    #: Parameters the heatmap depends on, setting them invalidates it
+    HEAT_PARAMETERS = ('k_temp', 'T_heater', 'T_cooler', 'T_env')
+    #: Parameters that can be scheduled in run(), the order is used by kernel
+    SCHEDULABLE = ('p_changedir', 'p_wall', 'p_meet', 'k_stay', 'T_ideal')
+    #: Kinds of logged events, their codes are the indices
+    EVENT_KINDS = ('wall', 'meet', 'wake')
+
     def __init__(self, map,
                  p_changedir=0.2, p_wall=0.8, p_meet=0.8,
                  k_temp=0.9, k_stay=50,
                  T_ideal=35, T_heater=40, T_cooler=5, T_env=22,
-                 min_wait=2):
+                 min_wait=2, *, copy=True):
         try:
             if map.ndim != 2:
                 raise ValueError(
@@ -37,7 +68,7 @@ class BeeClust:
         except AttributeError:
             raise TypeError('Wrong type of map, it has no .ndim.')
 
-        self.map = map.astype(numpy.int8)
+        self.map = self._ingest(map, copy)
 
         self._set_numeric('p_changedir', p_changedir)
         self._set_numeric('p_wall', p_wall)
@@ -56,9 +87,45 @@ class BeeClust:
         if not (T_cooler <= T_env <= T_heater):
             raise ValueError('Make sure that T_cooler <= T_env <= T_heater')
 
-        self._heater_distances = numpy.empty(map.shape)
-        self._cooler_distances = numpy.empty(map.shape)
-        self.recalculate_heat()
+        self._heater_distances = None
+        self._cooler_distances = None
+        # running sum of bees' temperatures, maintained by the tick kernel,
+        # it is valid only with the heatmap, the count is None until needed
+        self._totals = numpy.zeros(1, dtype='float64')
+        self._bee_count = None
+        self._history = None
+        self._history_metrics = ()
+        self._events = None
+        self._event_chunks = []
+        self._event_directory = None
+        self._stream = None
+        # held by the ticking methods, batches of streams run in threads
+        self._lock = threading.RLock()
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name in self.HEAT_PARAMETERS:
+            self.invalidate_heat()
+
+    @staticmethod
+    def _ingest(map, copy):
+        """
+        Get the map as an int8 numpy array.
+
+        Without copy, the array shares the map's buffer, unless its dtype
+        differs or it is read-only. The kernels work with any strides.
+        """
+        array = numpy.asarray(map)
+        if copy:
+            return array.astype(numpy.int8)
+        if array.dtype != numpy.int8:
+            reason = f'its dtype is {array.dtype}, not int8'
+        elif not array.flags.writeable:
+            reason = 'it is read-only'
+        else:
+            return array
+        warnings.warn(f'The map is copied, {reason}', stacklevel=3)
+        return array.astype(numpy.int8)
 
     def _set_numeric(self, name, value, *, neg=False):
         """
@@ -91,9 +158,322 @@ class BeeClust:
 
         Returns number of moved bees.
         """
-        return _speedups.tick(self.map, self.heatmap, self.p_changedir,
-                              self.p_wall, self.p_meet, self.min_wait,
-                              self.k_stay, self.T_ideal)
+        with self._lock:
+            return _speedups.tick(self.map, self.heatmap, self.p_changedir,
+                                  self.p_wall, self.p_meet, self.min_wait,
+                                  self.k_stay, self.T_ideal, self._totals,
+                                  self._bee_count, self._history,
+                                  self._events)
+
+    def run(self, ticks, schedule=None):
+        """
+        Do {ticks} steps of BeeClust algorithm in a single kernel call.
+
+        schedule: mapping of SCHEDULABLE parameters to their values
+          over the ticks, either an array of values for every tick,
+          or a piecewise-linear schedule as (tick, value) pairs
+          (constant before the first and after the last one);
+          the ticks are counted from 0 in this run, the attributes
+          of self are not changed
+
+        Returns total number of moves.
+        """
+        self._check_ticks('ticks', ticks)
+        values, scheduled = self._schedule(ticks, schedule)
+        with self._lock:
+            _, moved, _ = _speedups.run(
+                self.map, self.heatmap, self.p_changedir, self.p_wall,
+                self.p_meet, self.min_wait, self.k_stay, self.T_ideal,
+                self._totals, self._bee_count, ticks, history=self._history,
+                schedule=values, scheduled=scheduled, events=self._events)
+        return moved
+
+    def _schedule(self, ticks, schedule):
+        """
+        Convert a schedule for run() to a (ticks, N) array of values
+        and an array of indices of the N parameters in SCHEDULABLE
+        (or Nones if there is nothing to schedule).
+        """
+        if not schedule:
+            return None, None
+        values = numpy.empty((ticks, len(schedule)), dtype='float64')
+        scheduled = numpy.empty(len(schedule), dtype='int64')
+        for column, (name, plan) in enumerate(schedule.items()):
+            if name not in self.SCHEDULABLE:
+                raise ValueError(f'{name} cannot be scheduled')
+            scheduled[column] = self.SCHEDULABLE.index(name)
+            try:
+                plan = numpy.asarray(plan, dtype='float64')
+            except (TypeError, ValueError):
+                raise TypeError(f'Wrong type of {name} schedule')
+            if plan.ndim == 1 and len(plan) == ticks:
+                values[:, column] = plan
+            elif plan.ndim == 2 and plan.shape[1] == 2 and len(plan):
+                order = numpy.argsort(plan[:, 0], kind='stable')
+                values[:, column] = numpy.interp(numpy.arange(ticks),
+                                                 plan[order, 0],
+                                                 plan[order, 1])
+            else:
+                raise ValueError(
+                    f'{name} schedule has to have {ticks} values '
+                    f'or (tick, value) pairs')
+            column_values = values[:, column]
+            if not numpy.isfinite(column_values).all():
+                raise ValueError(f'{name} has to be finite')
+            if not name.startswith('T_') and (column_values < 0).any():
+                raise ValueError(f'{name} cannot be negative')
+            if name.startswith('p_') and (column_values > 1).any():
+                raise ValueError(
+                    f'{name} is a probability, it cannot be larger than 1')
+        return values, scheduled
+
+    async def astream(self, ticks_per_frame=1, fields=('map',), frames=None):
+        """
+        Stream the simulation to asyncio code
+
+        Usage: async for frame in beeclust.astream(...)
+
+        Batches of ticks run in the event loop's default executor without
+        the GIL, so the loop is not blocked. All streams of a simulation
+        share the batches and the simulation never waits for them:
+        a slow consumer gets the latest frame, the older ones are skipped.
+        The simulation runs only while there is a consumer, the last one
+        leaving waits for the running batch. When the stream is left
+        by break, it is closed later, tick(), run() and run_until()
+        wait for the batch meanwhile, other changes of the simulation
+        should be done after closing it explicitly (see aclose()).
+
+        ticks_per_frame: number of ticks between frames (the same for
+          all concurrent streams)
+        fields: fields of frames' data, see streaming.FIELDS
+        frames: number of frames to yield, infinite by default
+
+        Yields streaming.Frame snapshots (tick, moved, skipped, data).
+        """
+        self._check_ticks('ticks_per_frame', ticks_per_frame)
+        if ticks_per_frame == 0:
+            raise ValueError('ticks_per_frame has to be positive')
+        if isinstance(fields, str):
+            fields = (fields,)
+        for field in fields:
+            if field not in streaming.FIELDS:
+                raise ValueError(f'Unknown field: {field}')
+        if frames is not None:
+            self._check_ticks('frames', frames)
+
+        if self._stream is None:
+            self._stream = streaming.Stream(self)
+        stream = self._stream
+        if stream.subscribers and stream.ticks_per_frame != ticks_per_frame:
+            raise ValueError(f'Simulation is streamed with ticks_per_frame='
+                             f'{stream.ticks_per_frame} already')
+        stream.ticks_per_frame = ticks_per_frame
+
+        subscriber = stream.subscribe(fields)
+        try:
+            count = 0
+            while frames is None or count < frames:
+                yield await subscriber.get()
+                count += 1
+        finally:
+            await stream.unsubscribe(subscriber)
+
+    def run_until(self, criteria, max_ticks):
+        """
+        Do steps of BeeClust algorithm until the simulation converges.
+
+        criteria: mapping of convergence thresholds, all given ones have
+          to hold for {window} consecutive ticks:
+           moved: maximal fraction of bees that moved in a tick
+           drift: maximal absolute change of score in a tick
+           stopped: minimal fraction of stopped bees after a tick
+           window: number of ticks (defaults to 1)
+        max_ticks: maximal number of ticks to do
+
+        The statistics are tracked inside the kernel loop.
+        Returns tuple: whether it converged, number of ticks done.
+        """
+        thresholds = self._criteria(criteria)
+        self._check_ticks('max_ticks', max_ticks)
+
+        with self._lock:
+            ticks, _, streak = _speedups.run(
+                self.map, self.heatmap, self.p_changedir, self.p_wall,
+                self.p_meet, self.min_wait, self.k_stay, self.T_ideal,
+                self._totals, self._bee_count, max_ticks, thresholds,
+                self._history, events=self._events)
+        return streak >= thresholds[-1], ticks
+
+    def _criteria(self, criteria):
+        """
+        Check criteria of run_until(), returns all the thresholds
+        (including window) in the CRITERIA order as an array.
+        """
+        unknown = set(criteria) - set(self.CRITERIA)
+        if unknown:
+            raise ValueError(f'Unknown criteria: {", ".join(sorted(unknown))}')
+        if not set(criteria) - {'window'}:
+            raise ValueError('At least one criterion threshold is needed')
+        for name, value in criteria.items():
+            if not isinstance(value, (int, float)):
+                raise TypeError(
+                    f'Wrong type of {name}: {type(value).__name__}')
+            if value < 0:
+                raise ValueError(f'{name} cannot be negative')
+        window = criteria.get('window', 1)
+        self._check_ticks('window', window)
+        if window == 0:
+            raise ValueError('window has to be positive')
+        return numpy.array([criteria.get(name, default)
+                            for name, default in self.CRITERIA.items()],
+                           dtype='float64')
+
+    def record_history(self, capacity, metrics=HISTORY_METRICS):
+        """
+        Start recording metrics of every tick to history.
+
+        The tick kernels fill a preallocated ring buffer, so only
+        the last {capacity} ticks are kept. Capacity of 0 stops recording.
+        Recording again starts a new history.
+
+        capacity: number of ticks to keep
+        metrics: names of metrics to record, a subset of HISTORY_METRICS:
+         moved: number of bees moved in the tick
+         stopped: number of stopped bees after the tick
+         score: score after the tick
+         wait: mean remaining wait time of stopped bees after the tick
+        """
+        self._check_ticks('capacity', capacity)
+        if isinstance(metrics, str):
+            metrics = (metrics,)
+        codes = []
+        for metric in metrics:
+            if metric not in self.HISTORY_METRICS:
+                raise ValueError(f'Unknown metric: {metric}')
+            codes.append(self.HISTORY_METRICS.index(metric))
+        if len(set(codes)) != len(codes):
+            raise ValueError('Metrics have to be unique')
+        if capacity == 0:
+            self._history = None
+            self._history_metrics = ()
+        else:
+            self._history = _speedups._History(capacity, codes)
+            self._history_metrics = tuple(metrics)
+
+    @property
+    def history(self):
+        """
+        Recorded metrics of last ticks as a structured array, or None
+
+        It has a field for every recorded metric plus a field tick
+        with number of the tick since the recording started (from 0).
+        Rows are sorted from the oldest tick.
+        """
+        if self._history is None:
+            return None
+        data = self._history.data
+        capacity = len(data)
+        count = self._history.count
+        first = max(0, count - capacity)
+        order = numpy.arange(first, count)
+        dtypes = {'moved': 'int64', 'stopped': 'int64'}
+        result = numpy.empty(len(order), dtype=[('tick', 'int64')] + [
+            (name, dtypes.get(name, 'float64'))
+            for name in self._history_metrics])
+        result['tick'] = order
+        for column, name in enumerate(self._history_metrics):
+            result[name] = data[order % capacity, column]
+        return result
+
+    def record_events(self, capacity, directory=None):
+        """
+        Start logging every stop and wake-up of a bee.
+
+        The tick kernels append the events to a preallocated buffer,
+        when it cannot hold an event of every bee before a tick (or when
+        it gets full during a tick), it is spilled: saved as a chunk
+        to the directory (as events-NNNNNN.npy), or kept in memory if
+        there is no directory. Capacity of 0 stops
+        logging. Logging again starts a new log, in both cases the pending
+        events are spilled first.
+
+        capacity: number of events in the buffer (larger buffers mean
+          fewer and bigger chunks, chunks of a tick each need at least
+          the number of bees)
+        directory: path to save chunks to (the existing ones are replaced)
+
+        Events have fields:
+         tick: number of the tick since the logging started (from 0)
+         row, col: position of the bee
+         kind: index of the kind in EVENT_KINDS:
+          wall, meet: the bee stopped after hitting a wall or another bee
+          wake: the bee started moving again
+         temperature: temperature at the position
+         wait: number of ticks the bee stopped for (0 for wake-ups)
+        """
+        self._check_ticks('capacity', capacity)
+        if self._events is not None:
+            self.flush_events()
+        self._events = None
+        self._event_chunks = []
+        self._event_directory = None
+        if capacity == 0:
+            return
+        if directory is not None:
+            directory = os.fspath(directory)
+            if not os.path.isdir(directory):
+                raise ValueError(f'{directory} is not a directory')
+        self._event_directory = directory
+        self._events = _speedups._Events(capacity, self._spill_events)
+
+    def _spill_events(self, events):
+        """
+        Save a chunk of events from the full buffer.
+        """
+        if self._event_directory is None:
+            self._event_chunks.append(events.copy())
+            return
+        path = os.path.join(self._event_directory,
+                            f'events-{len(self._event_chunks):06d}.npy')
+        numpy.save(path, events)
+        self._event_chunks.append(path)
+
+    def flush_events(self):
+        """
+        Spill the logged events from the buffer now (see record_events)
+
+        Returns list of all chunks of the log so far: paths of the saved
+        chunks if there is a directory, arrays of events otherwise.
+        """
+        if self._events is None:
+            raise ValueError('Events are not logged')
+        self._events.flush()
+        return list(self._event_chunks)
+
+    @property
+    def events(self):
+        """
+        Logged events that are in memory as a structured array, or None
+
+        With a directory, the events saved to chunks are not included.
+        Rows are sorted by tick, see record_events() for the fields.
+        """
+        if self._events is None:
+            return None
+        chunks = [chunk for chunk in self._event_chunks
+                  if not isinstance(chunk, str)]
+        chunks.append(self._events.data[:self._events.count])
+        return numpy.concatenate(chunks)
+
+    @staticmethod
+    def _check_ticks(name, value):
+        """
+        Check that value is a non-negative integer number of ticks.
+        """
+        if not isinstance(value, int):
+            raise TypeError(f'Wrong type of {name}: {type(value).__name__}')
+        if value < 0:
+            raise ValueError(f'{name} cannot be negative')
 
     def recalculate_heat(self):
         """
@@ -102,11 +482,47 @@ class BeeClust:
         This can be useful when you change the map. You are
         required to call this method on your own in the right
         time to ensure that simulation will be consistent.
+        It also recounts bees and their temperatures for score.
+        See also invalidate_heat() to recalculate only when needed.
         """
-        heatmap = numpy.full(self.map.shape, self.T_env, dtype='float64')
-        self.heatmap = _speedups.recalculate_heat(heatmap, self.map,
-                                                  self.T_heater, self.T_cooler,
-                                                  self.T_env, self.k_temp)
+        if (self._heater_distances is None
+                or self._heater_distances.shape != self.map.shape):
+            self._heater_distances = numpy.empty(self.map.shape, dtype='int64')
+            self._cooler_distances = numpy.empty(self.map.shape, dtype='int64')
+        heatmap = numpy.empty(self.map.shape, dtype='float64')
+        _speedups.recalculate_heat(heatmap, self.map,
+                                   self._heater_distances,
+                                   self._cooler_distances,
+                                   self.T_heater, self.T_cooler,
+                                   self.T_env, self.k_temp)
+        self.heatmap = heatmap
+        self._bee_count = _speedups.count_bees(self.map, self.heatmap,
+                                               self._totals)
+
+    def invalidate_heat(self):
+        """
+        Mark heat as outdated, it is recalculated when needed next time
+
+        Call this when you change heaters, coolers or walls in the map.
+        Setting any of HEAT_PARAMETERS does it automatically.
+        Changing bees directly in the map requires it as well, so they
+        are recounted (bulk operations like place_bees() take care of it).
+        """
+        self._heatmap = None
+        self._bee_count = None
+
+    @property
+    def heatmap(self):
+        """
+        Temperature of every field of the map (NaN for walls)
+        """
+        if self._heatmap is None:
+            self.recalculate_heat()
+        return self._heatmap
+
+    @heatmap.setter
+    def heatmap(self, heatmap):
+        self._heatmap = heatmap
 
     @property
     def bees(self):
@@ -124,19 +540,184 @@ class BeeClust:
         """
         return _speedups.swarms(self.map)
 
+    def swarm_stats(self):
+        """
+        Compute statistics of swarms in a single pass
+
+        Returns a structured array with a row for every swarm (in the same
+        order as swarms) with fields:
+         size: number of bees
+         temperature: mean temperature of the bees
+         stopped: fraction of stopped bees
+         top, left, bottom, right: bounding box (included)
+        """
+        return _speedups.swarm_stats(self.map, self.heatmap)
+
+    def swarm_summary(self, stats=None):
+        """
+        Summarize swarms
+
+        stats: result of swarm_stats() to use, computed if not given
+
+        Returns a dict with:
+         count: number of swarms
+         histogram: array of numbers of swarms indexed by size
+         largest: row of swarm_stats() of the largest swarm (or None)
+        """
+        if stats is None:
+            stats = self.swarm_stats()
+        return {
+            'count': len(stats),
+            'histogram': numpy.bincount(stats['size'], minlength=1),
+            'largest': stats[stats['size'].argmax()] if len(stats) else None,
+        }
+
+    def density_index(self):
+        """
+        Build a DensityIndex for rectangle queries of the number of bees
+        and their mean temperature (in constant time per rectangle)
+
+        It is a snapshot of the current state, it takes a single pass
+        over the map.
+        """
+        return density.DensityIndex(self.map, self.heatmap)
+
+    @property
+    def bee_count(self):
+        """
+        Number of bees in the map (maintained, no map scan)
+        """
+        if self._bee_count is None:
+            self._bee_count = _speedups.count_bees(self.map)
+        return self._bee_count
+
     @property
     def score(self):
         """
         Compute score as average bee's temperature
+
+        The sum of temperatures is maintained during ticks,
+        so this is a constant time operation.
         """
-        temps = [self.heatmap[pos] for pos in self.bees]
-        if len(temps) == 0:
+        if self._heatmap is None:
+            self.recalculate_heat()
+        if self._bee_count == 0:
             raise ValueError('No bees in beeclust')
-        return sum(temps) / len(temps)
+        return float(self._totals[0] / self._bee_count)
+
+    def render(self, out=None, scale=1, overlay='heat'):
+        """
+        Render the map to an RGBA image (uint8 array of shape (rows, cols, 4))
+
+        Moving bees are yellow (north), orange (east), green (south) or
+        magenta (west), stopped bees are white. Walls are gray, heaters red
+        and coolers blue. Empty fields show the heat gradient from dark blue
+        (T_cooler) to dark red (T_heater), or are black without overlay.
+
+        out: buffer to render to, allocated if not given
+        scale: size of a square block of fields rendered to one pixel,
+          such pixels show density of bees over block's mean temperature
+        overlay: 'heat' or None
+
+        Returns the rendered image (out if given).
+        """
+        if not isinstance(scale, int):
+            raise TypeError(f'Wrong type of scale: {type(scale).__name__}')
+        if scale < 1:
+            raise ValueError('scale has to be positive')
+        if overlay not in ('heat', None):
+            raise ValueError(f'Unknown overlay: {overlay}')
+        if out is None:
+            rows, cols = (-(-size // scale) for size in self.map.shape)
+            out = numpy.empty((rows, cols, 4), dtype='uint8')
+        heat = overlay == 'heat'
+        _speedups.render(self.map, self.heatmap if heat else None, out,
+                         scale, self.T_cooler, self.T_heater, heat)
+        return out
 
     def forget(self):
         """
         Make all bees to forget their movement direction
         """
-        self.map[numpy.where((self.map < 0)
-                             | ((1 <= self.map) & (self.map <= 4)))] = -1
+        _speedups.forget(self.map)
+
+    def wake_all(self):
+        """
+        Make all stopped bees to start moving in the next tick
+        """
+        _speedups.wake_all(self.map)
+
+    def place_bees(self, coords, states=-1):
+        """
+        Place bees to empty fields
+
+        coords: coordinates of the fields, (N, 2) array-like
+        states: a bee value (see Map) for all the bees or for each of them,
+          by default they start moving in a random direction in next tick
+
+        Nothing is changed if any of the fields is not empty.
+        """
+        coords = self._coords(coords)
+        states = self._values('states', states, len(coords))
+        placed = _speedups.place_bees(self.map, self._heatmap, coords,
+                                      states, self._totals)
+        if self._bee_count is not None:
+            self._bee_count += placed
+
+    def remove_bees(self, coords):
+        """
+        Remove bees from the map
+
+        coords: coordinates of the bees, (N, 2) array-like
+
+        Nothing is changed if there is no bee on any of the fields.
+        """
+        removed = _speedups.remove_bees(self.map, self._heatmap,
+                                        self._coords(coords), self._totals)
+        if self._bee_count is not None:
+            self._bee_count -= removed
+
+    def set_directions(self, coords, directions):
+        """
+        Make bees move in given directions (stopped bees start moving)
+
+        coords: coordinates of the bees, (N, 2) array-like
+        directions: direction (1 to 4, see Map) for all the bees
+          or for each of them
+
+        Nothing is changed if there is no bee on any of the fields.
+        """
+        coords = self._coords(coords)
+        directions = self._values('directions', directions, len(coords))
+        _speedups.set_directions(self.map, coords, directions)
+
+    @staticmethod
+    def _coords(coords):
+        """
+        Convert coordinates to a (N, 2) int64 array (not copied if it is)
+        """
+        coords = numpy.asarray(coords)
+        if coords.size == 0:
+            return coords.astype('int64').reshape((0, 2))
+        if coords.dtype.kind not in 'iu':
+            raise TypeError(f'Wrong type of coords: {coords.dtype}')
+        if coords.ndim != 2 or coords.shape[1] != 2:
+            raise ValueError(
+                f'Wrong shape of coords {coords.shape}, expected (N, 2)')
+        return coords.astype('int64', copy=False)
+
+    @staticmethod
+    def _values(name, values, count):
+        """
+        Convert map values to an int8 array of length 1 or count
+        """
+        values = numpy.asarray(values)
+        if values.dtype.kind not in 'iu':
+            raise TypeError(f'Wrong type of {name}: {values.dtype}')
+        if values.size and (values.min() < -128 or values.max() > 127):
+            raise ValueError(f'{name} out of range of map values')
+        values = values.astype('int8', copy=False).reshape(-1)
+        if len(values) not in (1, count):
+            raise ValueError(
+                f'Wrong number of {name} ({len(values)}, expected {count})')
+        return values
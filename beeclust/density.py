@@ -0,0 +1,68 @@
+"""
+Rectangle queries of bee density over a snapshot of BeeClust simulation.
+
+Summed-area tables (integral images) of bee occupancy and of bee
+temperatures are built in a single pass over the map, afterwards
+the number of bees and their mean temperature in any rectangle
+are computed from four table lookups.
+"""
+import numpy
+
+from . import _speedups
+
+
+class DensityIndex:
+    """
+    Summed-area tables of bees and their temperatures.
+
+    It is a snapshot, it does not follow later ticks of the simulation,
+    build a new one by BeeClust.density_index() instead (it takes a single
+    pass over the map, like a tick).
+
+    Boxes are given as (top, left, bottom, right) with bottom and right
+    excluded, like slices. They are clipped to the map, so the whole map
+    is (0, 0, rows, cols) or anything larger. An array of shape (..., 4)
+    can be given to do many queries at once.
+    """
+    def __init__(self, map, heatmap):
+        rows, cols = map.shape
+        self.shape = map.shape
+        self.counts = numpy.empty((rows + 1, cols + 1), dtype='int64')
+        self.temps = numpy.empty((rows + 1, cols + 1), dtype='float64')
+        _speedups.integrate(map, heatmap, self.counts, self.temps)
+
+    def _sum(self, table, boxes):
+        try:
+            boxes = numpy.asarray(boxes, dtype='int64')
+        except (TypeError, ValueError):
+            raise TypeError('Boxes have to be integers')
+        if boxes.shape[-1:] != (4,):
+            raise ValueError('Boxes have to have shape (..., 4)')
+        rows, cols = self.shape
+        top, bottom = (numpy.clip(boxes[..., i], 0, rows) for i in (0, 2))
+        left, right = (numpy.clip(boxes[..., i], 0, cols) for i in (1, 3))
+        bottom = numpy.maximum(top, bottom)
+        right = numpy.maximum(left, right)
+        return (table[bottom, right] - table[top, right]
+                - table[bottom, left] + table[top, left])
+
+    def count(self, boxes):
+        """
+        Number of bees in the boxes
+        """
+        return self._sum(self.counts, boxes)
+
+    def temperature_sum(self, boxes):
+        """
+        Sum of temperatures of bees in the boxes
+        """
+        return self._sum(self.temps, boxes)
+
+    def temperature(self, boxes):
+        """
+        Mean temperature of bees in the boxes (NaN for boxes without bees)
+        """
+        counts = self.count(boxes)
+        sums = self.temperature_sum(boxes)
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            return numpy.where(counts > 0, sums / counts, numpy.nan)[()]
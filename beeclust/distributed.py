@@ -0,0 +1,312 @@
+"""
+BeeClust simulation distributed to worker processes on a single host.
+
+The map is split into horizontal strips, each of them is ticked
+by a worker process from a pool. The map and the heatmap live in shared
+memory, so the workers only exchange small lists of bees heading to another
+strip (halo exchange). Those are resolved after all strips were ticked,
+boundary by boundary, in a fixed order.
+"""
+import multiprocessing
+import os
+import time
+import warnings
+import weakref
+from multiprocessing import shared_memory
+
+import numpy
+
+from . import _speedups
+from .beeclust import BeeClust
+
+
+# Shared state of a worker process, set by _attach()
+_worker = {}
+
+
+def _attach(shape, map_name, heatmap_name, requests_name, requests_shape):
+    """
+    Initialize a worker process: attach shared memory and seed randomness.
+    """
+    segments = [shared_memory.SharedMemory(name) for name in
+                (map_name, heatmap_name, requests_name)]
+    _worker['segments'] = segments
+    _worker['map'] = numpy.ndarray(shape, dtype='int8',
+                                   buffer=segments[0].buf)
+    _worker['heatmap'] = numpy.ndarray(shape, dtype='float64',
+                                       buffer=segments[1].buf)
+    _worker['requests'] = numpy.ndarray(requests_shape, dtype='int32',
+                                        buffer=segments[2].buf)
+    _speedups.seed((os.getpid() * 1000003 + time.time_ns()) % 2 ** 32)
+
+
+def _tick_strip(strip, first, last, params, logging):
+    """
+    Tick rows from first to last (not included) of the shared map.
+    """
+    m, heatmap = _worker['map'], _worker['heatmap']
+    north, south = _worker['requests'][strip]
+    top = 1 if first > 0 else 0
+    bottom = 1 if last < len(m) else 0
+    *stats, events = _speedups.tick_strip(m[first - top:last + bottom],
+                                          heatmap[first - top:last + bottom],
+                                          *params, top, top + last - first,
+                                          north, south, logging)
+    if events is not None:
+        events['row'] += first - top
+    return (*stats, events)
+
+
+def _resolve(strip, boundary, params, logging):
+    """
+    Resolve bees crossing the boundary between strip and the next one.
+    """
+    rows = slice(boundary - 1, boundary + 1)
+    requests = _worker['requests']
+    *stats, events = _speedups.resolve(_worker['map'][rows],
+                                       _worker['heatmap'][rows], *params,
+                                       requests[strip, 1],
+                                       requests[strip + 1, 0], logging)
+    if events is not None:
+        events['row'] += boundary - 1
+    return (*stats, events)
+
+
+def _label(name, first, last, offset):
+    """
+    Label swarms in rows from first to last (not included).
+    """
+    segment = shared_memory.SharedMemory(name)
+    labels = numpy.ndarray(_worker['map'].shape, dtype='int64',
+                           buffer=segment.buf)
+    try:
+        return _speedups.label(_worker['map'][first:last],
+                               labels[first:last], offset)
+    finally:
+        del labels
+        segment.close()
+
+
+def _release(pool, segments):
+    """
+    Stop the pool and free shared memory (also used as a finalizer).
+    """
+    pool.terminate()
+    pool.join()
+    for segment in segments:
+        segment.close()
+        segment.unlink()
+
+
+class DistributedBeeClust(BeeClust):
+    """
+    BeeClust swarming algorithm simulation split to worker processes.
+
+    The map is split into horizontal strips of at least 2 rows, each
+    of them is ticked in a worker process. Bees heading to another strip
+    are moved after all strips were ticked, if the field is still empty
+    (otherwise they meet a bee). This differs from the serial simulation
+    only for bees crossing the boundaries.
+
+    Arguments:
+     map, p_*, k_*, T_*, min_wait: see BeeClust
+     workers: number of worker processes (defaults to number of CPUs)
+     copy: the map is always copied to shared memory,
+       copy=False only warns about it
+
+    Attributes: see BeeClust, map and heatmap are in shared memory.
+
+    Use it as a context manager or call close() to stop the workers.
+    run_until() and recording of history and events are done in Python
+    after every tick, the logged events of a tick are ordered by strips,
+    stops of bees crossing the boundaries come last.
+    """
+    def __init__(self, map, *args, workers=None, **kwargs):
+        self._segments = []
+        if not kwargs.pop('copy', True):
+            warnings.warn('The map is copied, it has to be in shared memory',
+                          stacklevel=2)
+        super().__init__(map, *args, **kwargs)
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if not isinstance(workers, int):
+            raise TypeError(
+                f'Wrong type of workers: {type(workers).__name__}')
+        if workers < 1:
+            raise ValueError('workers has to be positive')
+
+        rows, cols = self.map.shape
+        strips = max(1, min(workers, rows // 2))
+        self._bounds = [rows * i // strips for i in range(strips + 1)]
+
+        segments = self._segments = [
+            shared_memory.SharedMemory(create=True, size=max(1, size))
+            for size in (self.map.nbytes, self.map.size * 8,
+                         strips * 2 * (cols + 1) * 4)]
+        shared_map = numpy.ndarray(self.map.shape, dtype='int8',
+                                   buffer=segments[0].buf)
+        shared_map[:] = self.map
+        self.map = shared_map
+        self._shared_heatmap = numpy.ndarray(self.map.shape, dtype='float64',
+                                             buffer=segments[1].buf)
+        requests_shape = (strips, 2, cols + 1)
+
+        self._pool = multiprocessing.Pool(
+            min(workers, strips), initializer=_attach,
+            initargs=(self.map.shape, segments[0].name, segments[1].name,
+                      segments[2].name, requests_shape))
+        self._finalizer = weakref.finalize(self, _release,
+                                           self._pool, segments)
+
+    def recalculate_heat(self):
+        super().recalculate_heat()
+        if self._segments:
+            self._shared_heatmap[:] = self.heatmap
+            self.heatmap = self._shared_heatmap
+
+    def _params(self, **overrides):
+        params = {name: getattr(self, name) for name in self.SCHEDULABLE}
+        params.update(overrides)
+        return (params['p_changedir'], params['p_wall'], params['p_meet'],
+                self.min_wait, params['k_stay'], params['T_ideal'])
+
+    def tick(self, **overrides):
+        """
+        Do single step of BeeClust algorithm in the worker processes.
+
+        overrides: values of SCHEDULABLE parameters for this step only
+
+        Returns number of moved bees.
+        """
+        moved, _, _ = self._tick(**overrides)
+        return moved
+
+    def _tick(self, **overrides):
+        """
+        Do single step, record it and return tuple: number of moved bees,
+        temperature change of moved bees, number of stopped bees.
+        """
+        self.heatmap  # the workers need it in the shared memory
+        params = self._params(**overrides)
+        bounds = self._bounds
+        logging = self._events is not None
+        with self._lock:
+            results = self._pool.starmap(_tick_strip, [
+                (strip, bounds[strip], bounds[strip + 1], params, logging)
+                for strip in range(len(bounds) - 1)])
+            results += self._pool.starmap(_resolve, [
+                (strip, bounds[strip + 1], params, logging)
+                for strip in range(len(bounds) - 2)])
+            moved, delta, stopped, wait_sum = (
+                sum(column) for column in list(zip(*results))[:4])
+            self._totals[0] += delta
+            if self._history is not None:
+                self._history.append(moved, stopped, wait_sum,
+                                     self._totals[0], self._bee_count)
+            if logging:
+                for *_, events in results:
+                    self._events.extend(events)
+                self._events.next_tick()
+        return moved, delta, stopped
+
+    def run(self, ticks, schedule=None):
+        """
+        Do {ticks} steps of BeeClust algorithm in the worker processes.
+
+        schedule: see BeeClust.run()
+
+        Returns total number of moves.
+        """
+        self._check_ticks('ticks', ticks)
+        values, scheduled = self._schedule(ticks, schedule)
+        with self._lock:
+            if values is None:
+                return sum(self.tick() for _ in range(ticks))
+            names = [self.SCHEDULABLE[index] for index in scheduled]
+            return sum(self.tick(**dict(zip(names, row.tolist())))
+                       for row in values)
+
+    def run_until(self, criteria, max_ticks):
+        """
+        Do steps of BeeClust algorithm in the worker processes
+        until the simulation converges, see BeeClust.run_until().
+
+        The statistics are tracked after every tick.
+        """
+        max_moved, max_drift, min_stopped, window = self._criteria(criteria)
+        self._check_ticks('max_ticks', max_ticks)
+        streak = ticks = 0
+        with self._lock:
+            while ticks < max_ticks:
+                moved, delta, stopped = self._tick()
+                ticks += 1
+                n = max(self.bee_count, 1)
+                if (moved / n <= max_moved and abs(delta) / n <= max_drift
+                        and stopped / n >= min_stopped):
+                    streak += 1
+                    if streak >= window:
+                        break
+                else:
+                    streak = 0
+        return streak >= window, ticks
+
+    @property
+    def swarms(self):
+        """
+        Enlist swarms as lists of coords of bees
+
+        Strips are labeled in the worker processes,
+        labels are merged on the boundaries afterwards.
+        """
+        bounds = self._bounds
+        segment = shared_memory.SharedMemory(
+            create=True, size=max(1, self.map.size * 8))
+        labels = numpy.ndarray(self.map.shape, dtype='int64',
+                               buffer=segment.buf)
+        try:
+            # labels of a strip can't exceed number of its fields
+            offsets = [bounds[strip] * self.map.shape[1] + 1
+                       for strip in range(len(bounds) - 1)]
+            counts = self._pool.starmap(_label, [
+                (segment.name, bounds[strip], bounds[strip + 1], offset)
+                for strip, offset in enumerate(offsets)])
+            if not sum(counts):
+                return []
+            used = numpy.zeros(self.map.size + 1, dtype='uint8')
+            for offset, count in zip(offsets, counts):
+                used[offset:offset + count] = True
+            mapping, count = _speedups.merge_labels(
+                labels, numpy.array(bounds[1:-1], dtype='int64'), used)
+            flat = mapping[labels.ravel()]
+        finally:
+            del labels
+            segment.close()
+            segment.unlink()
+
+        indices = numpy.flatnonzero(flat)
+        indices = indices[numpy.argsort(flat[indices], kind='stable')]
+        sizes = numpy.bincount(flat[indices], minlength=count + 1)[1:]
+        rows, cols = numpy.divmod(indices, self.map.shape[1])
+        splits = numpy.cumsum(sizes)[:-1]
+        return [list(zip(r.tolist(), c.tolist())) for r, c in
+                zip(numpy.split(rows, splits), numpy.split(cols, splits))]
+
+    def close(self):
+        """
+        Stop the worker processes and free the shared memory.
+
+        The map and the heatmap are copied out of the shared memory,
+        so they remain usable.
+        """
+        if self._finalizer.alive:
+            self.map = self.map.copy()
+            self.heatmap = self.heatmap.copy()
+            self._shared_heatmap = None
+            self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,127 @@
+"""
+Streaming of BeeClust simulations to asyncio consumers.
+
+A single producer task runs batches of ticks in an executor (the tick
+kernels release the GIL, so the event loop keeps running) and publishes
+a frame after every batch. It never waits for consumers: every one of them
+gets the latest frame, the frames it was too slow for are skipped.
+When the last consumer leaves, it waits for the running batch,
+so the simulation is not changed behind the consumer's back afterwards.
+"""
+import asyncio
+import collections
+import types
+
+
+#: Fields that can be requested in frames
+FIELDS = ('map', 'heatmap', 'score', 'bee_count', 'image', 'swarm_stats')
+
+
+Frame = collections.namedtuple('Frame', 'tick moved skipped data')
+Frame.__doc__ = """
+A snapshot of BeeClust simulation.
+
+tick: number of ticks done by the stream so far
+moved: number of moves during the last batch of ticks
+skipped: number of frames skipped since the previous received frame
+data: read-only mapping of the requested fields, arrays are read-only copies
+"""
+
+
+class _Subscriber:
+    """
+    A consumer of a stream, holds only the latest frame.
+    """
+    def __init__(self, fields):
+        self.fields = fields
+        self.frame = None
+        self.skipped = 0
+        self.error = None
+        self.event = asyncio.Event()
+
+    def publish(self, frame):
+        if self.frame is not None:
+            self.skipped += 1
+        self.frame = frame
+        self.event.set()
+
+    async def get(self):
+        await self.event.wait()
+        self.event.clear()
+        if self.error is not None:
+            raise self.error
+        frame = self.frame._replace(skipped=self.skipped)
+        self.frame = None
+        self.skipped = 0
+        return frame
+
+
+class Stream:
+    """
+    Producer of frames of a BeeClust simulation for its subscribers.
+
+    It runs only while it has subscribers.
+    """
+    def __init__(self, beeclust):
+        self.beeclust = beeclust
+        self.ticks_per_frame = 1
+        self.subscribers = set()
+        self.tick = 0
+        self._task = None
+
+    def subscribe(self, fields):
+        subscriber = _Subscriber(frozenset(fields))
+        self.subscribers.add(subscriber)
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._produce())
+        return subscriber
+
+    async def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+        if not self.subscribers and self._task is not None:
+            # the producer stops after the running batch
+            await asyncio.shield(self._task)
+
+    def _step(self, ticks, fields):
+        """
+        Run a batch of ticks and take a snapshot (runs in the executor).
+        """
+        b = self.beeclust
+        data = {}
+        # ticks done meanwhile would mix two states in the snapshot
+        with b._lock:
+            moved = b.run(ticks)
+            for field in fields:
+                if field in ('map', 'heatmap'):
+                    data[field] = getattr(b, field).copy()
+                elif field == 'image':
+                    data[field] = b.render()
+                elif field == 'swarm_stats':
+                    data[field] = b.swarm_stats()
+                elif field == 'score':
+                    data[field] = b.score if b.bee_count else None
+                else:
+                    data[field] = getattr(b, field)
+                if hasattr(data[field], 'setflags'):
+                    data[field].setflags(write=False)
+        return moved, data
+
+    async def _produce(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while self.subscribers:
+                fields = frozenset().union(
+                    *(subscriber.fields for subscriber in self.subscribers))
+                ticks = self.ticks_per_frame
+                moved, data = await loop.run_in_executor(
+                    None, self._step, ticks, fields)
+                self.tick += ticks
+                for subscriber in self.subscribers:
+                    subscriber.publish(Frame(
+                        self.tick, moved, 0, types.MappingProxyType(
+                            {field: data[field]
+                             for field in subscriber.fields})))
+        except Exception as error:
+            for subscriber in self.subscribers:
+                subscriber.error = error
+                subscriber.event.set()
@@ -1,15 +1,65 @@
-from setuptools import setup, find_packages
+import os
+import tempfile
+
+from setuptools import setup, find_packages, Extension
+from setuptools.command.build_ext import build_ext
 from Cython.Build import cythonize
 import numpy
 
 
+# Flags enabling OpenMP, by compiler, tried in this order
+OPENMP_FLAGS = {
+    'msvc': [(['/openmp'], [])],
+    'unix': [(['-fopenmp'], ['-fopenmp']),
+             # Apple clang with libomp installed
+             (['-Xpreprocessor', '-fopenmp'], ['-lomp'])],
+}
+
+
+class openmp_build_ext(build_ext):
+    """
+    Build the extensions with OpenMP if the compiler supports it,
+    prange loops run serially otherwise.
+    """
+    def _openmp_flags(self):
+        source = ('#include <omp.h>\n'
+                  'int main(void) {return omp_get_max_threads();}\n')
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'openmp_probe.c')
+            with open(path, 'w') as f:
+                f.write(source)
+            for compile_args, link_args in OPENMP_FLAGS.get(
+                    self.compiler.compiler_type, []):
+                try:
+                    objects = self.compiler.compile(
+                        [path], output_dir=tmp, extra_postargs=compile_args)
+                    self.compiler.link_executable(
+                        objects, os.path.join(tmp, 'openmp_probe'),
+                        extra_postargs=link_args)
+                except Exception:
+                    continue
+                return compile_args, link_args
+        print('OpenMP is not available, building without parallel loops')
+        return [], []
+
+    def build_extensions(self):
+        compile_args, link_args = self._openmp_flags()
+        for extension in self.extensions:
+            extension.extra_compile_args += compile_args
+            extension.extra_link_args += link_args
+        super().build_extensions()
+
+
 setup(
     name='beeclust',
     version='0.2',
     description='BeeClust swarming algorithm with Python\'s NumPy and Cython',
     license='MIT',
     packages=find_packages(),
-    ext_modules=cythonize('beeclust/_speedups.pyx'),
+    ext_modules=cythonize([
+        Extension('beeclust._speedups', ['beeclust/_speedups.pyx']),
+    ]),
+    cmdclass={'build_ext': openmp_build_ext},
     include_dirs=[numpy.get_include()],
     install_requires=[
         'NumPy',
@@ -1,5 +1,7 @@
 import numpy
 
+from beeclust import BeeClust
+
 
 def zeros8(*args, **kwargs):
     kwargs.setdefault('dtype', numpy.int8)
@@ -9,3 +11,23 @@ def zeros8(*args, **kwargs):
 def full8(*args, **kwargs):
     kwargs.setdefault('dtype', numpy.int8)
     return numpy.full(*args, **kwargs)
+
+
+#: Probabilities of map values in random_map() by default
+MAP_PROBABILITIES = {0: .5, 1: .1, 2: .1, 3: .1, 4: .1, 5: .02, 6: .04, 7: .04}
+
+
+def random_map(shape=32, probabilities=MAP_PROBABILITIES):
+    """Random map of given shape (or square size), values by probabilities"""
+    if isinstance(shape, int):
+        shape = (shape, shape)
+    values = list(probabilities)
+    return numpy.random.choice(values, shape,
+                               p=[probabilities[v] for v in values])
+
+
+def walker(length=5, wall=True):
+    """A bee walking right in a corridor of given length, then hitting
+    a wall (in 4 ticks by default) and waiting"""
+    return BeeClust(numpy.array([[2] + [0] * (length - 1) + [5] * wall]),
+                    p_changedir=0, p_wall=1)
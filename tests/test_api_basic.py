@@ -1,3 +1,5 @@
+import numpy
+import pytest
 from collections import abc
 from helpers import zeros8
 from beeclust import BeeClust
@@ -53,3 +55,62 @@ def test_forget_is_callable():
 def test_recalculate_heat_is_callable():
     b = BeeClust(zeros8((2, 2)))
     b.recalculate_heat()
+
+
+def test_map_is_copied_by_default():
+    simple_map = zeros8((4, 6))
+    b = BeeClust(simple_map)
+    assert not numpy.shares_memory(b.map, simple_map)
+
+
+def test_map_is_not_copied_without_copy():
+    simple_map = zeros8((4, 6))
+    simple_map[0, 0] = 2
+    b = BeeClust(simple_map, p_changedir=0, copy=False)
+    assert numpy.shares_memory(b.map, simple_map)
+    b.tick()
+    assert simple_map[0, 1] == 2
+
+
+def test_buffer_map_without_copy():
+    buffer = bytearray(24)
+    buffer[0] = 2
+    b = BeeClust(memoryview(buffer).cast('b', (4, 6)), p_changedir=0,
+                 copy=False)
+    assert b.bee_count == 1
+    b.tick()
+    assert buffer[1] == 2
+
+
+def test_strided_map_without_copy():
+    simple_map = zeros8((4, 6))
+    b = BeeClust(simple_map[::2, ::-1], copy=False)
+    b.place_bees([(1, 0)], 3)
+    assert simple_map[2, 5] == 3
+
+
+def test_external_write_needs_invalidate_heat():
+    simple_map = zeros8((4, 6))
+    b = BeeClust(simple_map, copy=False)
+    assert b.bee_count == 0
+    simple_map[1, 1] = 3
+    b.invalidate_heat()
+    assert b.bee_count == 1
+    assert b.score == b.heatmap[1, 1]
+
+
+def test_wrong_dtype_map_copied_with_warning():
+    simple_map = numpy.zeros((4, 6), dtype=numpy.int64)
+    with pytest.warns(UserWarning) as record:
+        b = BeeClust(simple_map, copy=False)
+    assert 'int64' in str(record[0].message)
+    assert not numpy.shares_memory(b.map, simple_map)
+
+
+def test_readonly_map_copied_with_warning():
+    simple_map = zeros8((4, 6))
+    simple_map.setflags(write=False)
+    with pytest.warns(UserWarning) as record:
+        b = BeeClust(simple_map, copy=False)
+    assert 'read-only' in str(record[0].message)
+    b.tick()
@@ -0,0 +1,110 @@
+import math
+import numpy
+import pytest
+
+from helpers import zeros8
+from beeclust import BeeClust
+
+
+def test_place_bees():
+    b = BeeClust(zeros8((3, 4)))
+    b.place_bees([(0, 1), (2, 3)])
+    assert (b.map[0, 1], b.map[2, 3]) == (-1, -1)
+    assert b.bee_count == 2
+    assert numpy.count_nonzero(b.map) == 2
+
+
+def test_place_bees_with_states():
+    b = BeeClust(zeros8((3, 4)))
+    b.place_bees(numpy.array([[0, 1], [2, 3]]), [2, -7])
+    assert (b.map[0, 1], b.map[2, 3]) == (2, -7)
+    b.place_bees([(1, 1)], 4)
+    assert b.map[1, 1] == 4
+    assert b.bee_count == 3
+
+
+def test_place_bees_updates_score():
+    simple_map = zeros8((3, 4))
+    simple_map[1, 2] = 6
+    b = BeeClust(simple_map)
+    b.place_bees([(1, 1)])
+    assert math.isclose(b.score, 38.2)
+    b.place_bees([(0, 0)])
+    assert math.isclose(b.score, (38.2 + b.heatmap[0, 0]) / 2)
+
+
+@pytest.mark.parametrize('coords', ([(1, 2)], [(3, 0)], [(0, -1)],
+                                    [(0, 0), (1, 2)]))
+def test_place_bees_to_wrong_fields_raises_ValueError(coords):
+    simple_map = zeros8((3, 4))
+    simple_map[1, 2] = 5
+    b = BeeClust(simple_map)
+    with pytest.raises(ValueError):
+        b.place_bees(coords)
+    assert (b.map == simple_map).all()
+    assert b.bee_count == 0
+
+
+@pytest.mark.parametrize('states', (0, 5, 200, [1, 2, 3]))
+def test_place_wrong_bees_raises_ValueError(states):
+    b = BeeClust(zeros8((3, 4)))
+    with pytest.raises(ValueError):
+        b.place_bees([(0, 0), (1, 1)], states)
+    assert b.bee_count == 0
+
+
+def test_remove_bees():
+    simple_map = zeros8((3, 4))
+    simple_map[0, 0] = 1
+    simple_map[1, 1] = -3
+    simple_map[2, 2] = 6
+    b = BeeClust(simple_map)
+    b.remove_bees([(1, 1), (1, 1)])
+    assert b.map[1, 1] == 0
+    assert b.bee_count == 1
+    assert math.isclose(b.score, b.heatmap[0, 0])
+    with pytest.raises(ValueError):
+        b.remove_bees([(0, 0), (2, 2)])
+    assert b.map[0, 0] == 1
+
+
+def test_set_directions():
+    simple_map = zeros8((3, 4))
+    simple_map[0, 0] = 1
+    simple_map[1, 1] = -3
+    b = BeeClust(simple_map)
+    b.set_directions([(0, 0), (1, 1)], 3)
+    assert (b.map[0, 0], b.map[1, 1]) == (3, 3)
+    b.set_directions([(0, 0), (1, 1)], [2, 4])
+    assert (b.map[0, 0], b.map[1, 1]) == (2, 4)
+    with pytest.raises(ValueError):
+        b.set_directions([(0, 0)], -1)
+    with pytest.raises(ValueError):
+        b.set_directions([(0, 1)], 1)
+
+
+def test_wake_all():
+    b = BeeClust(numpy.array([[-5, 2, 5, -1, 0]]))
+    b.wake_all()
+    assert (b.map == [[-1, 2, 5, -1, 0]]).all()
+
+
+def test_str_states_raise_TypeError():
+    b = BeeClust(zeros8((3, 4)))
+    with pytest.raises(TypeError):
+        b.place_bees([(0, 0)], 'impossibru')
+
+
+@pytest.mark.parametrize('coords', ([(0.7, 1.9)], [('0', '1')]))
+def test_non_integer_coords_raise_TypeError(coords):
+    b = BeeClust(zeros8((3, 4)))
+    with pytest.raises(TypeError):
+        b.place_bees(coords)
+    assert not b.map.any()
+
+
+def test_empty_coords():
+    b = BeeClust(zeros8((3, 4)))
+    b.place_bees([])
+    b.remove_bees(numpy.empty((0, 2), dtype='uint8'))
+    assert b.bee_count == 0
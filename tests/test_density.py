@@ -0,0 +1,54 @@
+import numpy
+import pytest
+
+from helpers import random_map
+from beeclust import BeeClust
+
+
+def test_density_matches_slices():
+    b = BeeClust(random_map())
+    index = b.density_index()
+    bees = (b.map < 0) | ((1 <= b.map) & (b.map <= 4))
+    boxes = numpy.random.randint(0, 33, (200, 4))
+    counts = index.count(boxes)
+    temps = index.temperature(boxes)
+    for (top, left, bottom, right), count, temp in zip(boxes, counts, temps):
+        inside = bees[top:bottom, left:right]
+        assert count == inside.sum()
+        if count:
+            expected = b.heatmap[top:bottom, left:right][inside].mean()
+            assert temp == pytest.approx(expected)
+        else:
+            assert numpy.isnan(temp)
+
+
+def test_density_single_box():
+    b = BeeClust(numpy.array([[1, 0, 6], [-2, 0, 3]]), T_heater=40)
+    index = b.density_index()
+    assert index.count((0, 0, 2, 3)) == 3
+    assert index.count((0, 0, 1, 1)) == 1
+    assert numpy.isnan(index.temperature((0, 1, 2, 2)))
+    assert index.temperature((0, 0, 10, 10)) == pytest.approx(b.score)
+
+
+def test_density_boxes_are_clipped():
+    b = BeeClust(numpy.array([[1, 2], [3, 4]]))
+    index = b.density_index()
+    assert (index.count([[-5, -5, 10, 10], [1, 1, 0, 0], [2, 0, 5, 2]])
+            == [4, 0, 0]).all()
+
+
+def test_density_is_snapshot():
+    b = BeeClust(numpy.array([[2, 0, 0]]), p_changedir=0)
+    index = b.density_index()
+    b.tick()
+    assert index.count((0, 0, 1, 1)) == 1
+    assert b.density_index().count((0, 0, 1, 1)) == 0
+
+
+def test_density_wrong_boxes():
+    index = BeeClust(numpy.array([[1, 0]])).density_index()
+    with pytest.raises(ValueError):
+        index.count((0, 0, 1))
+    with pytest.raises(TypeError):
+        index.count(('a', 0, 1, 1))
@@ -0,0 +1,130 @@
+import math
+import numpy
+import pytest
+
+from helpers import random_map
+from beeclust import BeeClust
+from beeclust.distributed import DistributedBeeClust
+
+
+def swt(swarms):
+    """Sanitize/sort swarms types"""
+    return sorted(sorted(tuple(b) for b in s) for s in swarms)
+
+
+def test_bee_crosses_strips():
+    column = numpy.array([[3], [0], [0], [0], [0], [0]])
+    with DistributedBeeClust(column, p_changedir=0, workers=3) as b:
+        for j in range(1, 6):
+            assert b.tick() == 1
+            assert b.map[j, 0] == 3
+            assert numpy.count_nonzero(b.map) == 1
+
+
+def test_bees_meet_on_boundary():
+    column = numpy.array([[0], [3], [1], [0]])
+    with DistributedBeeClust(column, p_changedir=0, p_meet=1,
+                             workers=2) as b:
+        assert b.tick() == 0
+        assert (b.map == [[0], [-3], [-3], [0]]).all()
+
+
+def test_wall_on_boundary():
+    column = numpy.array([[0], [3], [5], [0]])
+    with DistributedBeeClust(column, p_changedir=0, p_wall=0,
+                             workers=2) as b:
+        assert b.tick() == 0
+        assert (b.map == [[0], [1], [5], [0]]).all()
+
+
+def test_distributed_run_schedule():
+    column = numpy.array([[3], [0], [0], [0], [0], [0]])
+    with DistributedBeeClust(column, p_changedir=1, workers=3) as b:
+        assert b.run(5, schedule={'p_changedir': [(0, 0)]}) == 5
+        assert b.map[5, 0] == 3
+        assert b.p_changedir == 1
+
+
+def falling_bee():
+    """A bee heading south through 3 strips, stopping at the bottom"""
+    column = numpy.array([[3], [0], [0], [0], [0], [0]])
+    return DistributedBeeClust(column, p_changedir=0, p_wall=1, workers=3)
+
+
+def test_distributed_run_until():
+    with falling_bee() as b:
+        assert b.run_until({'stopped': 1}, 100) == (True, 6)
+        assert b.map[5, 0] < 0
+    with falling_bee() as b:
+        assert b.run_until({'moved': 0, 'window': 3}, 4) == (False, 4)
+
+
+def test_distributed_history():
+    with falling_bee() as b:
+        b.record_history(10)
+        b.run(7)
+        history = b.history
+        assert list(history['moved']) == [1] * 5 + [0, 0]
+        assert list(history['stopped']) == [0] * 5 + [1, 1]
+        assert math.isclose(history['score'][4], b.heatmap[5, 0])
+
+
+def test_distributed_events():
+    with falling_bee() as b:
+        b.record_events(4)
+        b.run(6)
+        event, = b.events
+        assert (event['tick'], event['row'], event['col']) == (5, 5, 0)
+        assert event['kind'] == BeeClust.EVENT_KINDS.index('wall')
+        assert event['wait'] == -b.map[5, 0]
+
+
+def test_distributed_events_on_boundary():
+    column = numpy.array([[0], [3], [1], [0]])
+    with DistributedBeeClust(column, p_changedir=0, p_meet=1,
+                             workers=2) as b:
+        b.record_events(1)
+        b.tick()
+        events = numpy.concatenate(b.flush_events())
+        assert list(events['row']) == [1, 2]
+        assert list(events['kind']) == [BeeClust.EVENT_KINDS.index('meet')] * 2
+        assert list(events['wait']) == [3, 3]
+
+
+def test_distributed_swarms_match_serial():
+    with DistributedBeeClust(random_map(64), workers=4) as b:
+        assert swt(b.swarms) == swt(BeeClust(b.map).swarms)
+
+
+def test_distributed_ticks_keep_bees():
+    with DistributedBeeClust(random_map(64), workers=4) as b:
+        count = b.bee_count
+        assert count == len(b.bees)
+        b.run(10)
+        assert count == len(b.bees)
+        temps = [b.heatmap[pos] for pos in b.bees]
+        assert math.isclose(b.score, sum(temps) / len(temps))
+        assert swt(b.swarms) == swt(BeeClust(b.map).swarms)
+
+
+def test_close_keeps_map():
+    b = DistributedBeeClust(random_map(8), workers=2)
+    original = b.map.copy()
+    b.close()
+    assert (b.map == original).all()
+    assert b.heatmap.shape == original.shape
+
+
+def test_no_copy_warns():
+    m = numpy.array([[1, 0], [0, 0], [0, 3]], dtype='int8')
+    with pytest.warns(UserWarning):
+        b = DistributedBeeClust(m, copy=False, workers=1)
+    with b:
+        assert not numpy.shares_memory(b.map, m)
+
+
+def test_wrong_workers():
+    with pytest.raises(ValueError):
+        DistributedBeeClust(random_map(8), workers=0)
+    with pytest.raises(TypeError):
+        DistributedBeeClust(random_map(8), workers='impossibru')
@@ -0,0 +1,117 @@
+import numpy
+import pytest
+
+from helpers import walker, zeros8
+from beeclust import BeeClust
+
+
+WALL, MEET, WAKE = range(3)
+
+
+def test_no_events_by_default():
+    b = BeeClust(zeros8((2, 2)))
+    b.tick()
+    assert b.events is None
+
+
+def test_events_wall_stop_and_wake():
+    b = walker()
+    b.record_events(10)
+    b.run(5)
+    events = b.events
+    assert len(events) == 1
+    stop = events[0]
+    assert (stop['tick'], stop['row'], stop['col']) == (4, 0, 4)
+    assert stop['kind'] == WALL
+    assert stop['temperature'] == b.heatmap[0, 4]
+    assert stop['wait'] == -b.map[0, 4]
+    b.run(int(stop['wait']))
+    events = b.events
+    assert len(events) == 2
+    assert events[1]['kind'] == WAKE
+    assert events[1]['tick'] == 4 + stop['wait']
+    assert events[1]['wait'] == 0
+    assert b.map[0, 4] > 0
+
+
+def test_events_meet():
+    b = BeeClust(numpy.array([[2, 4]]), p_changedir=0, p_meet=1)
+    b.record_events(2)
+    b.tick()
+    events = b.events
+    assert list(events['kind']) == [MEET, MEET]
+    assert list(events['col']) == [0, 1]
+    assert list(events['tick']) == [0, 0]
+
+
+def test_events_spill_to_memory():
+    b = walker()
+    b.record_events(1)
+    b.run(30)
+    chunks = b.flush_events()
+    assert len(chunks) > 2
+    assert all(len(chunk) == 1 for chunk in chunks)
+    events = b.events
+    assert len(events) == len(chunks)
+    assert (numpy.diff(events['tick']) > 0).all()
+    assert list(events['kind'][:2]) == [WALL, WAKE]
+
+
+def test_events_spill_to_directory(tmp_path):
+    b = walker()
+    b.record_events(2, tmp_path)
+    b.run_until({'moved': 0, 'window': 30}, 30)
+    files = b.flush_events()
+    assert len(b.events) == 0
+    assert files == sorted(str(path) for path in tmp_path.iterdir())
+    events = numpy.concatenate([numpy.load(path) for path in files])
+    assert (numpy.diff(events['tick']) > 0).all()
+    assert events['kind'][0] == WALL
+    assert events['tick'][0] == 4
+
+
+def test_events_stop_recording(tmp_path):
+    b = walker()
+    b.record_events(4, tmp_path)
+    b.run(5)
+    b.record_events(0)
+    assert b.events is None
+    assert len(numpy.load(tmp_path / 'events-000000.npy')) == 1
+    b.run(5)
+    with pytest.raises(ValueError):
+        b.flush_events()
+
+
+def test_events_capacity_lower_than_bees():
+    b = BeeClust(numpy.array([[2, 5, 2, 5]]), p_changedir=0, p_wall=1)
+    b.record_events(1)
+    b.tick()
+    chunks = b.flush_events()
+    assert [len(chunk) for chunk in chunks] == [1, 1]
+    assert list(numpy.concatenate(chunks)['col']) == [0, 2]
+
+
+def test_events_stale_bee_count():
+    b = walker()
+    b.record_events(2)
+    b.tick()
+    assert len(b.events) == 0
+    # bees written to the map directly, the maintained count is stale
+    b.map[:] = -1
+    b.tick()
+    events = b.events
+    assert len(events) == 6
+    assert (events['kind'] == WAKE).all()
+    assert (events['tick'] == 1).all()
+
+
+@pytest.mark.parametrize('capacity', (-1, 1.5, None))
+def test_events_wrong_capacity(capacity):
+    b = walker()
+    with pytest.raises((TypeError, ValueError)):
+        b.record_events(capacity)
+
+
+def test_events_wrong_directory(tmp_path):
+    with pytest.raises(ValueError):
+        walker().record_events(10, tmp_path / 'missing')
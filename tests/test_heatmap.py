@@ -1,7 +1,8 @@
 import math
 import numpy
+import pytest
 
-from helpers import full8, zeros8
+from helpers import full8, random_map, zeros8
 from beeclust import BeeClust
 
 
@@ -188,3 +189,126 @@ def test_score_changes():
     score = b.score
     b.tick()
     assert b.score < score
+
+
+def reference_distances(simple_map, source):
+    """Plain BFS over 8 neighbours, as slow as it gets"""
+    distances = numpy.full(simple_map.shape, -1)
+    frontier = list(zip(*numpy.where(simple_map == source)))
+    for pos in frontier:
+        distances[pos] = 0
+    while frontier:
+        following = []
+        for r, c in frontier:
+            for nr in range(r - 1, r + 2):
+                for nc in range(c - 1, c + 2):
+                    if (0 <= nr < simple_map.shape[0] and
+                            0 <= nc < simple_map.shape[1] and
+                            simple_map[nr, nc] != WALL and
+                            distances[nr, nc] < 0):
+                        distances[nr, nc] = distances[r, c] + 1
+                        following.append((nr, nc))
+        frontier = following
+    return distances
+
+
+def reference_heatmap(simple_map, k_temp=.9):
+    """Heat computed serially, with the same operations as the kernel"""
+    heater = reference_distances(simple_map, HEATER)
+    cooler = reference_distances(simple_map, COOLER)
+    heatmap = numpy.empty(simple_map.shape)
+    for r in range(simple_map.shape[0]):
+        for c in range(simple_map.shape[1]):
+            hd, cd = int(heater[r, c]), int(cooler[r, c])
+            if simple_map[r, c] == WALL:
+                heatmap[r, c] = math.nan
+            elif hd == 0:
+                heatmap[r, c] = T_HEATER
+            elif cd == 0:
+                heatmap[r, c] = T_COOLER
+            else:
+                heating = (1.0 / hd) * (T_HEATER - T_ENV)
+                cooling = (1.0 / cd) * (T_ENV - T_COOLER)
+                heatmap[r, c] = T_ENV + k_temp * (max(0, heating)
+                                                  - max(0, cooling))
+    return heatmap
+
+
+@pytest.mark.parametrize('size', (50, 300))
+def test_heatmap_large_map(size):
+    # computed serially and in parallel (larger than PARALLEL_MIN)
+    simple_map = random_map(size, {0: .8, 5: .18, 6: .01, 7: .01})
+    b = BeeClust(simple_map)
+    assert numpy.array_equal(b.heatmap, reference_heatmap(simple_map),
+                             equal_nan=True)
+
+
+def test_heatmap_is_lazy(monkeypatch):
+    from beeclust import _speedups
+    calls = []
+    recalculate_heat = _speedups.recalculate_heat
+
+    def counting(*args):
+        calls.append(args)
+        return recalculate_heat(*args)
+
+    monkeypatch.setattr(_speedups, 'recalculate_heat', counting)
+    simple_map = zeros8((3, 3))
+    simple_map[1, 1] = -2
+    b = BeeClust(simple_map)
+    assert b.bee_count == 1
+    assert len(b.swarms) == 1
+    assert not calls
+    assert math.isclose(b.score, T_ENV)
+    b.heatmap
+    b.tick()
+    assert len(calls) == 1
+
+
+def test_heat_parameter_invalidates_heatmap():
+    simple_map = zeros8((3, 3))
+    simple_map[1, 1] = HEATER
+    simple_map[0, 0] = 1
+    b = BeeClust(simple_map)
+    assert math.isclose(b.heatmap[0, 1], 38.2)
+    b.T_heater = 50
+    assert math.isclose(b.heatmap[0, 1], 47.2)
+    assert math.isclose(b.score, 47.2)
+
+
+def test_invalidate_heat_after_map_change():
+    b = BeeClust(zeros8((3, 3)))
+    assert math.isclose(b.heatmap[0, 0], T_ENV)
+    b.map[1, 1] = COOLER
+    b.map[2, 2] = 2
+    b.invalidate_heat()
+    assert math.isclose(b.heatmap[0, 0], 6.7)
+    assert b.bee_count == 1
+    assert math.isclose(b.score, 6.7)
+
+
+def test_heatmap_after_map_shape_changes():
+    b = BeeClust(zeros8((3, 3)))
+    b.heatmap
+    b.map = zeros8((300, 300))
+    b.map[0, 0] = HEATER
+    b.recalculate_heat()
+    assert b.heatmap.shape == (300, 300)
+    b.map = zeros8((5, 7))
+    b.map[4, 6] = COOLER
+    b.invalidate_heat()
+    assert b.heatmap.shape == (5, 7)
+    assert b.heatmap[4, 6] == T_COOLER
+
+
+@pytest.mark.parametrize('shapes', (((2, 3), (3, 3), (3, 3)),
+                                    ((3, 3), (3, 2), (3, 3)),
+                                    ((3, 3), (3, 3), (4, 3))))
+def test_recalculate_heat_kernel_checks_shapes(shapes):
+    from beeclust import _speedups
+    heatmap = numpy.empty(shapes[0])
+    heater, cooler = (numpy.empty(shape, dtype='int64')
+                      for shape in shapes[1:])
+    with pytest.raises(ValueError):
+        _speedups.recalculate_heat(heatmap, zeros8((3, 3)), heater, cooler,
+                                   T_HEATER, T_COOLER, T_ENV, .9)
@@ -0,0 +1,72 @@
+import math
+import numpy
+import pytest
+
+from helpers import walker, zeros8
+from beeclust import BeeClust
+
+
+def test_no_history_by_default():
+    b = BeeClust(zeros8((2, 2)))
+    b.tick()
+    assert b.history is None
+
+
+def test_history_records_ticks():
+    b = walker()
+    b.record_history(100)
+    assert len(b.history) == 0
+    b.tick()
+    b.run(5)
+    history = b.history
+    assert list(history['tick']) == list(range(6))
+    assert list(history['moved']) == [1, 1, 1, 1, 0, 0]
+    assert list(history['stopped']) == [0, 0, 0, 0, 1, 1]
+    assert math.isclose(history['score'][3], b.heatmap[0, 4])
+    assert numpy.isnan(history['wait'][:4]).all()
+    assert history['wait'][4] == -b.map[0, 4] + 1
+    assert history['wait'][5] == -b.map[0, 4]
+
+
+def test_history_run_until():
+    b = walker()
+    b.record_history(100)
+    b.run_until({'moved': 0}, 10)
+    assert len(b.history) == 5
+
+
+def test_history_is_a_ring_buffer():
+    b = walker()
+    b.record_history(3)
+    b.run(5)
+    history = b.history
+    assert list(history['tick']) == [2, 3, 4]
+    assert list(history['moved']) == [1, 1, 0]
+
+
+def test_history_selected_metrics():
+    b = walker()
+    b.record_history(10, metrics=('score', 'moved'))
+    b.tick()
+    assert b.history.dtype.names == ('tick', 'score', 'moved')
+
+
+def test_history_can_be_stopped():
+    b = walker()
+    b.record_history(10)
+    b.tick()
+    b.record_history(0)
+    assert b.history is None
+
+
+def test_history_unknown_metric_raises_ValueError():
+    b = walker()
+    with pytest.raises(ValueError) as excinfo:
+        b.record_history(10, metrics=('moved', 'bogus'))
+    assert 'bogus' in str(excinfo.value)
+
+
+def test_history_negative_capacity_raises_ValueError():
+    b = walker()
+    with pytest.raises(ValueError):
+        b.record_history(-1)
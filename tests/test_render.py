@@ -0,0 +1,61 @@
+import numpy
+import pytest
+
+from helpers import zeros8
+from beeclust import BeeClust
+
+
+def test_render_shape():
+    b = BeeClust(zeros8((5, 7)))
+    image = b.render()
+    assert image.shape == (5, 7, 4)
+    assert image.dtype == numpy.uint8
+    assert (image[:, :, 3] == 255).all()
+
+
+def test_render_objects():
+    b = BeeClust(numpy.array([[1, 2, 3, 4], [-3, 5, 6, 7]]))
+    image = b.render(overlay=None)
+    assert (image[0, 0, :3] == [255, 255, 0]).all()
+    assert (image[0, 1, :3] == [255, 128, 0]).all()
+    assert (image[0, 2, :3] == [0, 255, 0]).all()
+    assert (image[0, 3, :3] == [255, 0, 255]).all()
+    assert (image[1, 0, :3] == [255, 255, 255]).all()
+    assert (image[1, 1, :3] == [128, 128, 128]).all()
+    assert (image[1, 2, :3] == [255, 0, 0]).all()
+    assert (image[1, 3, :3] == [0, 0, 255]).all()
+
+
+def test_render_heat_overlay():
+    b = BeeClust(numpy.array([[6, 0, 0, 0, 0, 0, 7]]))
+    image = b.render().astype(int)
+    assert (image[0, 1:-1, 1] == 0).all()
+    assert (numpy.diff(image[0, 1:-1, 0]) <= 0).all()
+    assert (numpy.diff(image[0, 1:-1, 2]) >= 0).all()
+    assert (b.render(overlay=None)[0, 1:-1, :3] == 0).all()
+
+
+def test_render_into_buffer():
+    b = BeeClust(zeros8((4, 4)))
+    out = numpy.zeros((4, 4, 4), dtype=numpy.uint8)
+    assert b.render(out) is out
+    assert (out[:, :, 3] == 255).all()
+
+
+def test_render_wrong_buffer_raises_ValueError():
+    b = BeeClust(zeros8((4, 4)))
+    with pytest.raises(ValueError):
+        b.render(numpy.zeros((4, 5, 4), dtype=numpy.uint8))
+
+
+def test_render_density():
+    simple_map = zeros8((4, 5))
+    simple_map[0:2, 0:2] = 1
+    simple_map[2:4, 2:4] = 5
+    b = BeeClust(simple_map)
+    image = b.render(scale=2, overlay=None)
+    assert image.shape == (2, 3, 4)
+    assert (image[0, 0, :3] == [255, 255, 0]).all()
+    assert (image[0, 1, :3] == 0).all()
+    assert (image[1, 1, :3] == [128, 128, 128]).all()
+    assert (image[1, 2, :3] == 0).all()
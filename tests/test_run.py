@@ -0,0 +1,117 @@
+import numpy
+import pytest
+
+from helpers import zeros8
+from beeclust import BeeClust
+
+
+def test_run_does_ticks():
+    b = BeeClust(numpy.array([[2, 0, 0, 0, 0, 0, 0, 0, 0, 0]]),
+                 p_changedir=0, p_wall=1)
+    assert b.run(5) == 5
+    assert b.map[0, 5] == 2
+    assert b.run(5) == 4
+    assert b.map[0, -1] < 0
+
+
+def test_run_zero_ticks():
+    b = BeeClust(numpy.array([[2, 0, 0]]))
+    assert b.run(0) == 0
+    assert (b.map == [[2, 0, 0]]).all()
+
+
+def test_run_returns_int():
+    b = BeeClust(zeros8((4, 6)))
+    assert isinstance(b.run(3), int)
+
+
+def test_run_until_stops_on_no_movement():
+    b = BeeClust(numpy.array([[-10, 0, 0]]))
+    converged, ticks = b.run_until({'moved': 0, 'window': 3}, 100)
+    assert converged
+    assert ticks == 3
+    assert b.map[0, 0] == -7
+
+
+def test_run_until_reaches_max_ticks():
+    b = BeeClust(numpy.array([[-10, 0, 0]]))
+    converged, ticks = b.run_until({'stopped': 1, 'window': 20}, 5)
+    assert not converged
+    assert ticks == 5
+    assert b.map[0, 0] == -5
+
+
+def test_run_until_stopped_ratio():
+    b = BeeClust(numpy.array([[0, 0, 0, 5, 4]]), p_changedir=0, p_wall=1)
+    converged, ticks = b.run_until({'stopped': 1}, 100)
+    assert converged
+    assert ticks == 1
+    assert b.map[0, 4] < 0
+
+
+def test_run_until_keeps_score():
+    b = BeeClust(numpy.array([[0, 0, 0, 0, 2, 0, 0, 0, 0, 6]]),
+                 p_changedir=0, p_wall=1)
+    converged, ticks = b.run_until({'drift': 0, 'window': 2}, 100)
+    assert converged
+    assert ticks == 6
+    assert b.score == b.heatmap[0, 8]
+
+
+@pytest.mark.parametrize('criteria', ({}, {'window': 5}, {'bogus': 1}))
+def test_run_until_bad_criteria_raise_ValueError(criteria):
+    b = BeeClust(zeros8((2, 2)))
+    with pytest.raises(ValueError):
+        b.run_until(criteria, 10)
+
+
+def test_run_until_str_criteria_raise_TypeError():
+    b = BeeClust(zeros8((2, 2)))
+    with pytest.raises(TypeError) as excinfo:
+        b.run_until({'moved': 'impossibru'}, 10)
+    assert 'moved' in str(excinfo.value)
+
+
+def test_run_schedule_per_tick():
+    b = BeeClust(numpy.array([[2, 0, 0, 0, 0, 0, 0, 0, 0, 0]]),
+                 p_changedir=1, p_wall=1)
+    assert b.run(5, schedule={'p_changedir': numpy.zeros(5)}) == 5
+    assert b.map[0, 5] == 2
+    assert b.p_changedir == 1
+
+
+def test_run_schedule_piecewise_linear():
+    b = BeeClust(numpy.array([[0, 0, 0, 5, 4]]), p_changedir=0, p_wall=1)
+    schedule = {'p_wall': [(2, 1), (0, 0)]}
+    # p_wall is 0 for the first tick, the bee turns back at the wall
+    assert b.run(1, schedule=schedule) == 0
+    assert b.map[0, 4] == 2
+    # it is 1 for the third tick, the bee surely stops
+    b.run(3, schedule=schedule)
+    assert b.map[0, 4] < 0
+
+
+def test_run_schedule_empty():
+    b = BeeClust(numpy.array([[2, 0, 0]]), p_changedir=0)
+    assert b.run(2, schedule={}) == 2
+
+
+@pytest.mark.parametrize('schedule', [
+    {'min_wait': [1, 2]},
+    {'p_meet': [0.5]},
+    {'p_meet': [0.5, 1.5]},
+    {'k_stay': [-1, 1]},
+    {'T_ideal': []},
+    {'p_wall': [float('nan'), float('nan')]},
+    {'T_ideal': [(0, 30), (1, float('inf'))]},
+])
+def test_run_schedule_wrong_values(schedule):
+    b = BeeClust(numpy.array([[2, 0, 0]]))
+    with pytest.raises(ValueError):
+        b.run(2, schedule=schedule)
+
+
+def test_run_schedule_wrong_type():
+    b = BeeClust(numpy.array([[2, 0, 0]]))
+    with pytest.raises(TypeError):
+        b.run(2, schedule={'p_wall': ['a', 'b']})
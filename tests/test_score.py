@@ -0,0 +1,44 @@
+import math
+
+from helpers import random_map, zeros8
+from beeclust import BeeClust
+
+
+# a map with many walls and stopped bees
+PROBABILITIES = {0: .5, 1: .05, 2: .05, 3: .05, 4: .05, 5: .1, 6: .05, 7: .05,
+                 -5: .1}
+
+
+def test_bee_count():
+    simple_map = zeros8((3, 4))
+    simple_map[0, 1] = 2
+    simple_map[2, 2] = -3
+    simple_map[1, 1] = 5
+    b = BeeClust(simple_map)
+    assert b.bee_count == 2
+
+
+def test_bee_count_stays_during_ticks():
+    b = BeeClust(random_map(probabilities=PROBABILITIES))
+    count = len(b.bees)
+    assert b.bee_count == count
+    for _ in range(20):
+        b.tick()
+        assert b.bee_count == count
+
+
+def test_maintained_score_matches_rescan():
+    b = BeeClust(random_map(probabilities=PROBABILITIES))
+    for _ in range(50):
+        b.tick()
+        temps = [b.heatmap[pos] for pos in b.bees]
+        assert math.isclose(b.score, sum(temps) / len(temps))
+
+
+def test_recalculate_heat_recounts():
+    b = BeeClust(zeros8((3, 4)))
+    assert b.bee_count == 0
+    b.map[1, 1] = 1
+    b.recalculate_heat()
+    assert b.bee_count == 1
+    assert math.isclose(b.score, 22)
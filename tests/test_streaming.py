@@ -0,0 +1,134 @@
+import asyncio
+import threading
+import numpy
+import pytest
+
+from helpers import walker, zeros8
+from beeclust import BeeClust
+
+
+async def collect(stream):
+    return [frame async for frame in stream]
+
+
+def test_astream_frames():
+    b = walker(100, wall=False)
+    frames = asyncio.run(collect(b.astream(ticks_per_frame=2, frames=3)))
+    assert [frame.tick for frame in frames] == [2, 4, 6]
+    assert [frame.moved for frame in frames] == [2, 2, 2]
+    assert frames[-1].data['map'][0, 6] == 2
+    assert frames[0].data['map'][0, 2] == 2
+
+
+def test_astream_snapshots_are_immutable():
+    b = walker(100, wall=False)
+    frame, = asyncio.run(collect(b.astream(
+        fields=('map', 'score', 'bee_count', 'image'), frames=1)))
+    assert set(frame.data) == {'map', 'score', 'bee_count', 'image'}
+    assert frame.data['bee_count'] == 1
+    assert frame.data['image'].shape == (1, 100, 4)
+    with pytest.raises(ValueError):
+        frame.data['map'][0, 0] = 1
+    with pytest.raises(TypeError):
+        frame.data['map'] = None
+
+
+def test_astream_skips_frames_for_slow_consumer():
+    b = walker(100, wall=False)
+
+    async def slow():
+        frames = []
+        async for frame in b.astream(frames=3):
+            frames.append(frame)
+            await asyncio.sleep(.05)
+        return frames
+
+    frames = asyncio.run(slow())
+    assert frames[-1].tick > 3
+    assert sum(frame.skipped for frame in frames) > 0
+
+
+def test_astream_shared_by_consumers():
+    b = walker(100, wall=False)
+
+    async def two():
+        return await asyncio.gather(collect(b.astream(frames=5)),
+                                    collect(b.astream(frames=5)))
+
+    first, second = asyncio.run(two())
+    assert len(first) == len(second) == 5
+    assert {frame.tick for frame in first} & {frame.tick for frame in second}
+
+
+def test_astream_does_not_block_loop():
+    b = BeeClust(numpy.random.choice(5, (300, 300)))
+
+    async def watch():
+        beats = 0
+        stream = b.astream(ticks_per_frame=20, frames=2)
+        task = asyncio.ensure_future(collect(stream))
+        while not task.done():
+            beats += 1
+            await asyncio.sleep(0)
+        return beats
+
+    assert asyncio.run(watch()) > 2
+
+
+@pytest.mark.parametrize('kwargs', ({'fields': ('bogus',)},
+                                    {'ticks_per_frame': 0},
+                                    {'frames': -1}))
+def test_astream_wrong_arguments_raise_ValueError(kwargs):
+    b = BeeClust(zeros8((2, 2)))
+    with pytest.raises(ValueError):
+        asyncio.run(collect(b.astream(**kwargs)))
+
+
+def recount(b):
+    return int(((b.map < 0) | ((1 <= b.map) & (b.map <= 4))).sum())
+
+
+def test_astream_end_waits_for_batch():
+    b = BeeClust(numpy.random.choice(5, (400, 400)))
+    bees = b.bee_count
+    asyncio.run(collect(b.astream(ticks_per_frame=10, frames=1)))
+    for _ in range(20):
+        b.tick()
+    assert recount(b) == bees
+    assert b.bee_count == bees
+
+
+def test_astream_break_does_not_race_ticks():
+    b = BeeClust(numpy.random.choice(5, (400, 400)))
+    bees = b.bee_count
+
+    async def first_then_tick():
+        async for frame in b.astream(ticks_per_frame=10):
+            break
+        for _ in range(20):
+            b.tick()
+
+    asyncio.run(first_then_tick())
+    assert recount(b) == bees
+    assert b.bee_count == bees
+
+
+def test_astream_snapshot_is_not_ticked_meanwhile():
+    b = walker(100, wall=False)
+    swarm_stats = b.swarm_stats
+    during = []
+
+    def slow_swarm_stats():
+        before = b.map.copy()
+        ticking = threading.Thread(target=b.tick)
+        ticking.start()
+        ticking.join(.1)
+        during.append((b.map == before).all())
+        return swarm_stats()
+
+    b.swarm_stats = slow_swarm_stats
+    frame, = asyncio.run(collect(b.astream(fields=('map', 'swarm_stats'),
+                                           frames=1)))
+    assert during and all(during)
+    assert frame.tick == 1
+    assert frame.data['map'][0, 1] == 2
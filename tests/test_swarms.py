@@ -1,6 +1,9 @@
+import collections
+
 import numpy
+import pytest
 
-from helpers import zeros8
+from helpers import random_map, zeros8
 from beeclust import BeeClust
 
 
@@ -9,6 +12,28 @@ def swt(swarms):
     return sorted(sorted(tuple(b) for b in s) for s in swarms)
 
 
+def reference_swarms(m):
+    """Swarms found by a simple BFS, in the order of their first bees"""
+    bees = (m < 0) | ((1 <= m) & (m <= 4))
+    seen = numpy.zeros_like(bees)
+    swarms = []
+    for start in zip(*numpy.nonzero(bees)):
+        if seen[start]:
+            continue
+        seen[start] = True
+        swarm, queue = [], collections.deque([start])
+        while queue:
+            r, c = queue.popleft()
+            swarm.append((r, c))
+            for nr, nc in ((r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1)):
+                if (0 <= nr < m.shape[0] and 0 <= nc < m.shape[1]
+                        and bees[nr, nc] and not seen[nr, nc]):
+                    seen[nr, nc] = True
+                    queue.append((nr, nc))
+        swarms.append(sorted(swarm))
+    return swarms
+
+
 def test_empty_map_empty_swarms():
     b = BeeClust(zeros8((2, 2)))
     assert len(b.swarms) == 0
@@ -70,3 +95,71 @@ def test_swarms_change_after_tick():
     assert len(b.swarms) == 1
     assert len(swt(b.swarms)[0]) == 1
     assert swt(b.swarms)[0][0] != (1, 0)
+
+
+def test_swarm_stats():
+    simple_map = numpy.array([
+        [1, -3, 0, 0],
+        [0, 2, 0, 6],
+        [0, 0, 0, -1],
+    ], dtype=numpy.int8)
+    b = BeeClust(simple_map)
+    stats = b.swarm_stats()
+    assert len(stats) == 2
+    first, second = stats
+    assert first['size'] == 3
+    assert numpy.isclose(first['temperature'],
+                         (b.heatmap[0, 0] + b.heatmap[0, 1] +
+                          b.heatmap[1, 1]) / 3)
+    assert numpy.isclose(first['stopped'], 1 / 3)
+    assert (first['top'], first['left'], first['bottom'],
+            first['right']) == (0, 0, 1, 1)
+    assert second['size'] == 1
+    assert second['stopped'] == 1
+    assert (second['top'], second['left'], second['bottom'],
+            second['right']) == (2, 3, 2, 3)
+
+
+def test_swarm_stats_match_swarms():
+    simple_map = random_map((40, 30),
+                            {0: .4, 1: .1, 2: .1, 3: .1, 4: .1, 5: .2})
+    b = BeeClust(simple_map)
+    stats = b.swarm_stats()
+    swarms = b.swarms
+    assert len(stats) == len(swarms)
+    for row, swarm in zip(stats, swarms):
+        assert row['size'] == len(swarm)
+        assert row['top'] == min(r for r, c in swarm)
+        assert row['right'] == max(c for r, c in swarm)
+
+
+def test_swarm_summary():
+    simple_map = zeros8((3, 5))
+    simple_map[0, :3] = 1
+    simple_map[2, 0] = 1
+    simple_map[2, 2] = 1
+    b = BeeClust(simple_map)
+    summary = b.swarm_summary()
+    assert summary['count'] == 3
+    assert list(summary['histogram']) == [0, 2, 0, 1]
+    assert summary['largest']['size'] == 3
+
+
+def test_swarm_summary_no_bees():
+    b = BeeClust(zeros8((2, 2)))
+    summary = b.swarm_summary()
+    assert summary['count'] == 0
+    assert summary['largest'] is None
+
+
+@pytest.mark.parametrize('shape', [(7, 200), (50, 129), (5, 130), (40, 300)])
+def test_swarms_on_wide_maps(shape):
+    m = random_map(shape, {0: .3, 1: .15, 2: .15, 3: .15, 4: .15, 5: .1})
+    # runs ending on and crossing 64-bit word boundaries
+    m[0, :] = 1
+    m[1, 64:128] = -2
+    m[2, 60:70] = 3
+    m[3, :64] = 4
+    swarms = [sorted((int(r), int(c)) for r, c in swarm)
+              for swarm in BeeClust(m).swarms]
+    assert swarms == reference_swarms(m)